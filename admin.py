@@ -1,17 +1,33 @@
 import argparse
+import datetime
 import glob
-import json
+import multiprocessing
 import os
+import sys
+import time
+from typing import Tuple
 
 from src import casey
+from src import gradebook
+from src import tracelog
 from src import utils
+from src.grade import grade
+from src.grade import suite
+from src.rules import snapshot
 
 
 def main():
     args = get_args()
+    if args.index:
+        count = gradebook.Gradebook().rebuild(args.course)
+        print(f"Indexed {count} score file(s)")
     if args.csv:
         compile_csv(args.course)
-    else:
+    elif args.summary:
+        summarize(args.course)
+    elif args.regrade:
+        regrade(args.course, args.assignment, args.procs, args.min_tests)
+    elif not args.index:
         filenames = utils.get_filenames(args.course, args.assignment)
         files = {}
         for filename in filenames:
@@ -33,40 +49,163 @@ def get_args():
     parser.add_argument("assignment")
     parser.add_argument("-a", "--admin", action="store_true")
     parser.add_argument("-c", "--csv", action="store_true")
+    parser.add_argument("-i", "--index", action="store_true")
+    parser.add_argument("-p", "--procs", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("-r", "--regrade", action="store_true")
+    parser.add_argument("-s", "--summary", action="store_true")
     parser.add_argument("-t", "--min-tests", type=int, default=5)
     parser.add_argument("-u", "--username", default=utils.get_admin_name())
     return parser.parse_args()
 
 
 def compile_csv(course: str) -> None:
-    scores = {}
     top_dirname = os.path.join(os.environ["HOME"], "inbox")
     assignments = sorted(os.listdir(os.path.join(top_dirname, course)))
     usernames = {os.path.basename(path) for path in
                  glob.glob(os.path.join(top_dirname, course, "*", "*"))}
-    for assignment in assignments:
-        for username in usernames:
-            scores.setdefault(username, [])
-            scores[username].append(load_score(course, assignment, username))
+    totals = gradebook.Gradebook().get_course(course)
     print(",".join(["username"] + assignments))
-    for username, items in scores.items():
+    for username in usernames:
+        items = [totals.get(username, {}).get(assignment, 0.0)
+                 for assignment in assignments]
         print(",".join([username] + [f"{i:.3f}" for i in items]))
 
 
-def load_score(course: str, assignment: str, username: str) -> float:
-    json_path = os.path.join(os.environ["HOME"], "inbox",
-                             course, assignment, username, "scores.json")
-    if not os.path.exists(json_path):
-        return 0.0
-    key = "[TOTAL]"
-    with open(json_path) as fp:
-        score = json.load(fp)
-        try:
-            if key in score:
-                return float(score[key])
-            return float(score[key + "[LATE]"])
-        except KeyError:
-            raise KeyError(f"{course} {assignment} {username}")
+def summarize(course: str, n_slowest: int = 10) -> None:
+    """
+    Print the latency percentiles of the course's logged submissions, its
+    slowest assignments, and its slowest submissions.
+    """
+    records = [record for record in tracelog.read_records()
+               if record["course"] == course and "total" in record]
+    if not records:
+        print(f"No submissions logged for {course}")
+        return
+    totals = [record["total"] for record in records]
+    hits = sum(record.get("cache") == "hit" for record in records)
+    errors = sum(record["status"] == "error" for record in records)
+    print(f"Submissions: {len(records)} (cache hits: {hits}, errors: {errors})")
+    print("Latency: " + "  ".join(f"p{q} {utils.percentile(totals, q):.3f}s"
+                                  for q in (50, 95, 99)))
+    by_assignment = {}
+    for record in records:
+        by_assignment.setdefault(record["assignment"], []).append(
+            record["total"])
+    print("\nSlowest assignments (p95):")
+    for assignment, values in sorted(
+            by_assignment.items(),
+            key=lambda item: utils.percentile(item[1], 95),
+            reverse=True)[:n_slowest]:
+        print(f"  {assignment:>16} {utils.percentile(values, 95):8.3f}s"
+              f" ({len(values)} submissions)")
+    print("\nSlowest submissions:")
+    for record in sorted(records, key=lambda r: r["total"],
+                         reverse=True)[:n_slowest]:
+        stages = sorted((stage for stage in record["stages"]
+                         if stage not in ("total", "package")),
+                        key=record["stages"].get, reverse=True)
+        print(f"  {record['time']} {record['assignment']:>16}"
+              f" {record['username']:>12} {record['total']:8.3f}s"
+              f" (slowest stage: {stages[0] if stages else '-'})")
+
+
+def regrade(course: str, assignment: str, n_procs: int, min_tests: int) -> None:
+    """
+    Regrade the finalized submission of every user of the assignment across a
+    pool of processes. Regraded users are recorded as they finish so that an
+    interrupted regrade resumes where it stopped, and a regrade run again
+    retries the users whose regrade failed.
+    """
+    dirname = os.path.join(utils.get_root_dirname(), course, assignment)
+    progress_path = os.path.join(utils.get_cache_dirname(course, assignment),
+                                 "regrade.txt")
+    usernames = sorted(name for name in os.listdir(dirname)
+                       if os.path.isdir(os.path.join(dirname, name))
+                       and not name.startswith("."))
+    done = set()
+    if os.path.exists(progress_path):
+        with open(progress_path, "r") as fp:
+            done = set(fp.read().split())
+        print(f"Resuming: {len(done)} user(s) already regraded")
+    todo = [username for username in usernames if username not in done]
+    os.makedirs(os.path.dirname(progress_path), mode=0o700, exist_ok=True)
+    start = time.time()
+    count = len(usernames) - len(todo)
+    failed = 0
+    with multiprocessing.Pool(n_procs, initializer=_init_regrade,
+                              initargs=(course, assignment, min_tests),
+                              maxtasksperchild=25) as pool, \
+         open(progress_path, "a") as progress:
+        for username, status, is_done in pool.imap_unordered(_regrade_user,
+                                                             todo):
+            if is_done:
+                progress.write(username + "\n")
+                progress.flush()
+            else:
+                failed += 1
+            count += 1
+            elapsed = time.time() - start
+            print(f"[{count}/{len(usernames)}] {elapsed:6.1f}s"
+                  f" {username}: {status}", file=sys.stderr)
+    if failed:
+        print(f"{failed} user(s) failed; run again to retry them")
+    else:
+        os.remove(progress_path)
+
+
+_regrade_args = {}
+
+
+def _init_regrade(course: str, assignment: str, min_tests: int) -> None:
+    """Load the config and compile the cases once per worker."""
+    _regrade_args.update(course=course, assignment=assignment,
+                         min_tests=min_tests)
+    snapshot.load(course, assignment)
+    suite.compile_cases(utils.get_cases_path(course, assignment))
+
+
+def _regrade_user(username: str) -> Tuple[str, str, bool]:
+    """
+    Regrade the user's finalized submission and return the username, the
+    outcome, and whether the user was regraded (or has nothing to regrade).
+    """
+    course = _regrade_args["course"]
+    assignment = _regrade_args["assignment"]
+    dirname = utils.get_submit_dirname(course, assignment, username)
+    files = {}
+    for filename in snapshot.get_filenames(course, assignment):
+        path = os.path.join(dirname, filename)
+        if os.path.exists(path):
+            with open(path, "r") as fp:
+                files[filename] = fp.read()
+    if not files:
+        return username, "no files", True
+    scores_path = os.path.join(dirname, "scores.json")
+    path = scores_path if os.path.exists(scores_path) else \
+        os.path.join(dirname, tuple(files)[0])
+    mtime = os.path.getmtime(path)
+    try:
+        output = casey.run(course, assignment, username, files,
+                           min_tests=_regrade_args["min_tests"],
+                           now=datetime.datetime.fromtimestamp(mtime),
+                           overwrite=True)
+    except KeyboardInterrupt:
+        raise
+    except BaseException as e:
+        # Casey's errors derive from BaseException, and one that escaped
+        # would kill the worker and leave the pool waiting for its result
+        return username, f"error ({e!r})", False
+    if "Submission Status" not in output:
+        lines = output.strip().splitlines()
+        return username, lines[0] if lines else "no output", False
+    # keep the original submission time for later regrades
+    for filename in list(files) + ["scores.json"]:
+        if os.path.exists(os.path.join(dirname, filename)):
+            os.utime(os.path.join(dirname, filename), (mtime, mtime))
+    scores = gradebook.Gradebook().load(course, assignment, username)
+    return (username, f"{grade.get_total(scores):.3f}" if scores else "done",
+            True)
 
 
 if __name__ == "__main__":
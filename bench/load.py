@@ -0,0 +1,280 @@
+"""
+Replay concurrent synthetic submissions against a Casey server using the same
+HTTP protocol as client.c and report throughput, tail latency, and error rates.
+
+    python -m bench.load -n 200 -c 20
+    python -m bench.load --serve "N_PROCS=4" --serve "N_PROCS=10 ZYGOTE=0"
+
+Submissions are built from the files in cases/<course>/<source>, in variants
+that pass, fail, time out, and contain syntax errors, and are graded as the
+assignment cases/<course>/<assignment>, which must be open and have cases
+that run. Each submission ends with a unique comment so that the server grades
+it rather than returning the cached result of an identical submission, unless
+--cached is given.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+
+from src import utils
+
+
+HEADER = ("# Name: Ann Lee\n# Course: CSC 101\n# Instructor: Dan Kay\n"
+          "# Assignment: Load Test\n# Term: Fall 2020\n\n")
+
+
+def _insert_into_functions(source: str, lines: List[str]) -> str:
+    """Insert |lines| at the top of the body of every top-level function."""
+    output = []
+    for line in source.splitlines(keepends=True):
+        output.append(line)
+        if line.startswith("def ") and line.rstrip().endswith(":"):
+            output.extend("    " + inserted + "\n" for inserted in lines)
+    return "".join(output)
+
+
+VARIANTS: Dict[str, Callable[[str], str]] = {
+    "pass": lambda source: HEADER + source,
+    "fail": lambda source: HEADER + _insert_into_functions(source,
+                                                           ["print()"]),
+    "timeout": lambda source: HEADER + _insert_into_functions(
+        source, ["while True:", "    pass"]),
+    "syntax": lambda source: HEADER + source + "\ndef broken(:\n    pass\n"}
+
+
+def build_submissions(course: str, source: str, n_submissions: int,
+                      n_users: int, mix: Dict[str, float], seed: int = 0,
+                      is_cached: bool = False
+) -> List[Tuple[str, str, Dict[str, str]]]:
+    """
+    Return (username, variant, files) for each synthetic submission. Unless
+    |is_cached|, the files of each submission end with a comment that differs
+    from those of every other submission.
+    """
+    dirname = utils.get_assignment_dirname(course, source)
+    sources = {}
+    for filename in utils.get_filenames(course, source):
+        with open(os.path.join(dirname, filename), "r") as fp:
+            sources[filename] = fp.read()
+    rng = random.Random(seed)
+    variants = rng.choices(list(mix), weights=list(mix.values()),
+                           k=n_submissions)
+    nonce = "" if is_cached else uuid.uuid4().hex
+    return [(f"load{i % n_users:04d}", variant,
+             {filename: VARIANTS[variant](text)
+                        + (f"# Submission {nonce}-{i}\n" if nonce else "")
+              for filename, text in sources.items()})
+            for i, variant in enumerate(variants)]
+
+
+def make_key(username: str, secret: str) -> str:
+    """Return the submission key that client.c sends for |username|."""
+    now = datetime.datetime.now()
+    hash_fun = hashlib.sha512()
+    hash_fun.update(username.encode())
+    hash_fun.update(f"{now.year:04}/{now.month:02}/{now.day:02}".encode())
+    hash_fun.update(secret.encode())
+    return hash_fun.hexdigest()
+
+
+def get_filenames(url: str, owner: str, course: str,
+                  assignment: str) -> List[str]:
+    with urllib.request.urlopen(f"{url}/{owner}/{course}/{assignment}/",
+                                timeout=10) as response:
+        return response.read().decode().split()
+
+
+def submit(url: str, owner: str, secret: str, course: str, assignment: str,
+           username: str, files: Dict[str, str],
+           timeout: float) -> Dict[str, Any]:
+    """
+    Post the files like client.c and return the time to the first line and
+    to the complete response, along with the outcome of the submission.
+    """
+    boundary = uuid.uuid4().hex
+    body = b""
+    for filename, text in files.items():
+        body += (f"--{boundary}\r\nContent-Disposition: form-data;"
+                 f' name="{filename}"; filename="{filename}"\r\n'
+                 "Content-Type: text/x-python\r\n\r\n").encode()
+        body += text.encode() + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    request = urllib.request.Request(
+        f"{url}/{owner}/{username}/{make_key(username, secret)}/{course}/"
+        f"{assignment}/", data=body, method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    started = time.perf_counter()
+    first_line = 0.0
+    text = ""
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            for line in response:
+                if not first_line:
+                    first_line = time.perf_counter() - started
+                text += line.decode(errors="replace")
+    except (OSError, urllib.error.URLError) as e:
+        return {"outcome": "error", "detail": repr(e),
+                "first_line": first_line,
+                "latency": time.perf_counter() - started}
+    return {"outcome": _classify(text), "first_line": first_line,
+            "latency": time.perf_counter() - started}
+
+
+def _classify(text: str) -> str:
+    if ("unexpected error" in text or "Invalid course number" in text
+            or "not yet ready" in text):
+        return "error"
+    if "active submission" in text or "superseded" in text:
+        return "rejected"
+    if "Submission Closed" in text:
+        return "closed"
+    return "graded"
+
+
+def run_load(url: str, owner: str, secret: str, course: str, assignment: str,
+             submissions: List[Tuple[str, str, Dict[str, str]]],
+             concurrency: int, timeout: float) -> Dict[str, Any]:
+    """Send all submissions with |concurrency| clients and summarize them."""
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        futures = {executor.submit(submit, url, owner, secret, course,
+                                   assignment, username, files, timeout):
+                   variant for username, variant, files in submissions}
+        results = []
+        for future in concurrent.futures.as_completed(futures):
+            results.append(dict(future.result(), variant=futures[future]))
+    elapsed = time.perf_counter() - started
+    return summarize(results, elapsed)
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = [result["latency"] for result in results]
+    first_lines = [result["first_line"] for result in results
+                   if result["first_line"]]
+    outcomes = {}
+    by_variant = {}
+    for result in results:
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+        by_variant.setdefault(result["variant"], []).append(result["latency"])
+    return {"submissions": len(results),
+            "elapsed": round(elapsed, 3),
+            "throughput": round(len(results) / elapsed, 3) if elapsed else 0.0,
+            "latency": _percentiles(latencies),
+            "first_line": _percentiles(first_lines),
+            "variants": {variant: _percentiles(values)
+                         for variant, values in sorted(by_variant.items())},
+            "outcomes": outcomes,
+            "error_rate": round(outcomes.get("error", 0) / len(results), 4)
+                          if results else 0.0}
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {"p50": round(utils.percentile(values, 50), 4),
+            "p95": round(utils.percentile(values, 95), 4),
+            "p99": round(utils.percentile(values, 99), 4),
+            "max": round(max(values, default=0.0), 4)}
+
+
+def start_server(settings: str, url: str, owner: str, course: str,
+                 assignment: str, wait: float = 60) -> None:
+    """Start the server with |settings| passed to make and wait until ready."""
+    subprocess.run(["make", "serve"] + shlex.split(settings),
+                   cwd=utils.get_top_dirname(), check=True)
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            get_filenames(url, owner, course, assignment)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def stop_server() -> None:
+    subprocess.run(["make", "shutdown"], cwd=utils.get_top_dirname(),
+                   check=False)
+
+
+def format_report(settings: str, report: Dict[str, Any]) -> str:
+    lines = [f"[{settings or 'running server'}]",
+             f"  {report['submissions']} submissions in {report['elapsed']}s"
+             f" ({report['throughput']}/s), error rate {report['error_rate']}",
+             f"  outcomes: {report['outcomes']}"]
+    fmt_str = "  {0:>10} | {1:>8} | {2:>8} | {3:>8} | {4:>8}"
+    lines.append(fmt_str.format("", "p50", "p95", "p99", "max"))
+    rows = [("latency", report["latency"]),
+            ("first line", report["first_line"])]
+    rows += list(report["variants"].items())
+    for name, values in rows:
+        lines.append(fmt_str.format(name, *(f"{values[q]:.3f}"
+                                            for q in ("p50", "p95", "p99",
+                                                      "max"))))
+    return "\n".join(lines)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=
+    """Casey Load Generator""")
+    parser.add_argument("-a", "--assignment", default="load")
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("-k", "--key-file", default="key.txt")
+    parser.add_argument("-m", "--mix", default="pass=4,fail=3,timeout=1,"
+                                               "syntax=2")
+    parser.add_argument("-n", "--submissions", type=int, default=100)
+    parser.add_argument("-o", "--output", default="")
+    parser.add_argument("-s", "--source", default="pset1")
+    parser.add_argument("-t", "--timeout", type=float, default=900)
+    parser.add_argument("-u", "--users", type=int, default=0)
+    parser.add_argument("--cached", action="store_true")
+    parser.add_argument("--course", default="101")
+    parser.add_argument("--owner", default=utils.get_admin_name())
+    parser.add_argument("--serve", action="append", default=[])
+    parser.add_argument("--url", default="http://localhost:5005")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    mix = {variant: float(weight) for variant, weight in
+           (item.split("=") for item in args.mix.split(","))}
+    submissions = build_submissions(args.course, args.source,
+                                    args.submissions,
+                                    args.users or args.submissions, mix,
+                                    is_cached=args.cached)
+    reports = {}
+    for settings in args.serve or [""]:
+        if settings:
+            start_server(settings, args.url, args.owner, args.course,
+                         args.assignment)
+        try:
+            key_path = os.path.join(utils.get_top_dirname(), args.key_file)
+            with open(key_path, "r") as fp:
+                secret = fp.readline().strip()
+            reports[settings] = run_load(args.url, args.owner, secret,
+                                         args.course, args.assignment,
+                                         submissions, args.concurrency,
+                                         args.timeout)
+        finally:
+            if settings:
+                stop_server()
+        print(format_report(settings, reports[settings]), file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(reports, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
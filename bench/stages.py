@@ -0,0 +1,423 @@
+"""
+Time each stage of the grading pipeline in isolation and save the results as
+JSON so that two commits can be compared for regressions.
+
+    python -m bench.stages -o before.json
+    python -m bench.stages -o after.json --compare before.json
+    python -m bench.stages -k defparse -k Suppressor --scale 4
+
+Each stage is timed on the files in cases/101/pset1 and on generated inputs
+that are far larger than any real submission: a module of many functions
+(large) and a module of one very long function (long).
+"""
+import argparse
+import ast
+import configparser
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from bench import load
+from src import error
+from src import gradebook
+from src import utils
+from src import write
+from src.grade import case
+from src.rules import langfeat
+from src.rules import rules
+from src.rules import valid
+from src.sandbox import safedef
+from src.sandbox import safemod
+from src.sandbox import sandbox
+from src.sandbox.ctxman import suppress
+from src.static import defparse
+
+
+COURSE = "101"
+ASSIGNMENT = "pset1"
+
+# name -> (prepare, calibrate), where prepare returns the callable to time
+Benchmark = Tuple[Callable[[], Callable[[], Any]], bool]
+
+
+def make_source(n_defs: int, n_blocks: int) -> str:
+    """
+    Return a module of |n_defs| functions, each with |n_blocks| blocks that
+    use every category of feature parsed by defparse.
+    """
+    lines = [load.HEADER]
+    for i in range(n_defs):
+        lines.append(f"def problem_{i}(xs: list, n: int) -> int:")
+        lines.append("    total = 0")
+        for j in range(n_blocks):
+            lines += [f"    for x in xs[{j}:]:",
+                      f"        if x % {j + 2} == 0 and x not in xs[:{j}]:",
+                      "            total += int(x) ** 2 // (n or 1)",
+                      "        elif x > n:",
+                      "            total -= abs(x) if x < 0 else len(str(x))",
+                      "    try:",
+                      f"        total += xs[{j}] << 1 | n & 3",
+                      "    except (IndexError, KeyError):",
+                      f"        raise ValueError(\"bad index {j}\")"]
+        lines.append("    return total\n\n")
+    return "\n".join(lines)
+
+
+def make_config(n_defs: int) -> configparser.ConfigParser:
+    """Return rules that restrict features to each of |n_defs| functions."""
+    config = rules.load_config(COURSE, ASSIGNMENT)
+    def_names = "\n".join(f"problem_{i}: {i % 5}+" for i in range(n_defs))
+    config.read_string(f"[calls: abs, len, str, list, dict]\n{def_names}\n"
+                       f"[operators: math, comp, bits]\n{def_names}\n"
+                       f"[keywords: for, if, try, raise]\n{def_names}\n"
+                       f"[exceptions: IndexError, KeyError]\n{def_names}\n")
+    return config
+
+
+def get_inputs(scale: int) -> Dict[str, str]:
+    """Return the source of each input module, keyed by the input's name."""
+    dirname = utils.get_assignment_dirname(COURSE, ASSIGNMENT)
+    with open(os.path.join(dirname, f"{ASSIGNMENT}.py"), "r") as fp:
+        pset1 = load.HEADER + fp.read()
+    return {"pset1": pset1,
+            "large": make_source(100 * scale, 5),
+            "long": make_source(1, 500 * scale)}
+
+
+def measure(prepare: Callable[[], Callable[[], Any]], repeat: int,
+            calibrate: bool = True, min_time: float = 0.05) -> Dict[str, Any]:
+    """
+    Return the seconds per call of the callable returned by |prepare|, which
+    is called again before each sample so that only the callable is timed.
+
+    If |calibrate| is True, each sample calls the callable as many times as
+    needed to take at least |min_time| seconds. Otherwise, each sample calls
+    it once (e.g. if it cannot be called twice on the same input).
+    """
+    number = 1
+    run = prepare()
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        if not calibrate or time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+    samples = []
+    for _ in range(repeat):
+        run = prepare()
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - started) / number)
+    return {"number": number, "repeat": repeat,
+            "min": min(samples), "median": statistics.median(samples),
+            "mean": statistics.mean(samples)}
+
+
+def _write_files(dirname: str, source: str) -> Dict[str, str]:
+    os.makedirs(dirname, exist_ok=True)
+    path = os.path.join(dirname, f"{ASSIGNMENT}.py")
+    with open(path, "w") as fp:
+        fp.write(source)
+    return {path: source}
+
+
+def _get_defs(source: str) -> List[ast.FunctionDef]:
+    return [node for node in ast.parse(source).body
+            if isinstance(node, ast.FunctionDef)]
+
+
+def _bench_defparse(parse: Callable[[ast.FunctionDef], Any],
+                    source: str) -> Benchmark:
+    nodes = _get_defs(source)
+
+    def run():
+        for node in nodes:
+            parse(node)
+
+    return (lambda: run), True
+
+
+def _bench_load_features(config: configparser.ConfigParser,
+                         files: Dict[str, str]) -> Benchmark:
+    paths = tuple(files)
+    return (lambda: lambda: langfeat.load_features(config, paths)), True
+
+
+def _bench_compile_features(config: configparser.ConfigParser,
+                            files: Dict[str, str]) -> Benchmark:
+    feat_rules = langfeat.load_features(config, tuple(files))
+    return (lambda: lambda: langfeat.CompiledRules(feat_rules)), True
+
+
+def _bench_validate(files: Dict[str, str], skip_lint: bool,
+                    skip_type: bool) -> Benchmark:
+    config = rules.load_config(COURSE, ASSIGNMENT)
+    feat_rules = langfeat.compile_features(config, tuple(files))
+    safemods = [safemod.SafeModule(path, source)
+                for path, source in files.items()]
+    return (lambda: lambda: valid.validate_package(
+        COURSE, ASSIGNMENT, files, feat_rules, safemods, skip_lint,
+        skip_type)), True
+
+
+def _create_sandbox(dirname: str) -> sandbox.Sandbox:
+    config = rules.load_config(COURSE, ASSIGNMENT)
+    feat_rules = langfeat.compile_features(config, ())
+    return sandbox.Sandbox(feat_rules.get_features("calls"),
+                           feat_rules.get_features("imports"), dirname, False)
+
+
+def _noop() -> None:
+    pass
+
+
+def _sum_lines() -> int:
+    total = 0
+    for _ in range(int(input())):
+        total += int(input())
+    print(total)
+    return total
+
+
+def _spin() -> None:
+    while True:
+        pass
+
+
+def _bench_capture(dirname: str, function: Callable[..., Any],
+                   stdin: str) -> Benchmark:
+    safefun = safedef.SafeFunction(function, _create_sandbox(dirname))
+    return (lambda: lambda: safefun.capture(_stdin=stdin, _timeout=1)), True
+
+
+def _bench_suppressor(n_lines: int) -> Benchmark:
+    stdin = "12345\n" * n_lines
+
+    def run():
+        with suppress.Suppressor(stdin=stdin):
+            for _ in range(n_lines):
+                input()
+
+    return (lambda: run), True
+
+
+def _bench_case(dirname: str, function: Callable[..., Any], expect: Any,
+                stdin: str, stdout: str, calibrate: bool = True) -> Benchmark:
+    """Time the construction and run of a Case, since a Case runs once."""
+    safefun = safedef.SafeFunction(function, _create_sandbox(dirname))
+    return (lambda: lambda: case.Case(safefun, (), expect, i=stdin, o=stdout,
+                                      t=1).run()), calibrate
+
+
+def _bench_group(dirname: str, function: Callable[..., Any], expect: Any,
+                 stdin: str, stdout: str, n_cases: int) -> Benchmark:
+    """Time a group of |n_cases| Cases run in one sandbox session."""
+    safefun = safedef.SafeFunction(function, _create_sandbox(dirname))
+
+    def prepare():
+        cases = [case.Case(safefun, (), expect, i=stdin, o=stdout, t=1)
+                 for _ in range(n_cases)]
+
+        def run():
+            with safefun.sandbox.session():
+                for each in cases:
+                    each.run()
+
+        return run
+
+    return prepare, True
+
+
+def _load_function(source: str, name: str) -> Callable[..., Any]:
+    namespace = {"__name__": ASSIGNMENT}
+    exec(compile(source, f"{ASSIGNMENT}.py", "exec"), namespace)
+    return namespace[name]
+
+
+def _bench_format_all(files: Dict[str, str]) -> Benchmark:
+    errors = error.ErrorFormatter(files)
+    source = tuple(files.values())[0]
+    for node in _get_defs(source):
+        linenos = set(range(node.lineno, node.end_lineno + 1))
+        name = f"{ASSIGNMENT}.{node.name}"
+        errors.add(name, "[call:sorted] prohibited", linenos=linenos)
+        errors.add(name, "[operator:**] prohibited",
+                   linenos=set(list(linenos)[::3]))
+        errors.add(name, "[pylint:too-many-branches]\nToo many branches",
+                   hidden=False, linenos={node.lineno})
+        try:
+            raise ValueError(node.name)
+        except ValueError:
+            errors.add_traceback(name, sys.exc_info())
+    return (lambda: errors.format_all), True
+
+
+def _bench_finalize(dirname: str, source: str, n_files: int) -> Benchmark:
+    book = gradebook.Gradebook(os.path.join(dirname, "gradebook.db"))
+    submit_dirname = os.path.join(dirname, COURSE, ASSIGNMENT, "user")
+    files = {os.path.join(submit_dirname, "tmp", f"{ASSIGNMENT}_{i}.py"): source
+             for i in range(n_files)}
+    scores = {("problem_1", 1.0): 1.0, ("problem_2", 1.0): 0.5}
+
+    def prepare():
+        writer = write.Writer(files, book)
+        writer.write_scores(scores, ("[TOTAL]", 0.75))
+        writer.write_errors("")
+        return writer.finalize
+
+    return prepare, False
+
+
+def get_benchmarks(dirname: str, scale: int) -> Dict[str, Benchmark]:
+    """Return every benchmark, using |dirname| for any files written."""
+    inputs = get_inputs(scale)
+    files = {name: _write_files(os.path.join(dirname, name), source)
+             for name, source in inputs.items()}
+    benchmarks = {}
+    parsers = (defparse.parse_calls, defparse.parse_exceptions,
+               defparse.parse_keywords, defparse.parse_operators,
+               defparse.parse_types, defparse.parse_features)
+    for name, source in inputs.items():
+        for parse in parsers:
+            benchmarks[f"defparse.{parse.__name__}[{name}]"] = \
+                _bench_defparse(parse, source)
+    benchmarks["langfeat.load_features[pset1]"] = _bench_load_features(
+        rules.load_config(COURSE, ASSIGNMENT), files["pset1"])
+    benchmarks["langfeat.load_features[large]"] = _bench_load_features(
+        make_config(100 * scale), files["large"])
+    benchmarks["langfeat.CompiledRules[pset1]"] = _bench_compile_features(
+        rules.load_config(COURSE, ASSIGNMENT), files["pset1"])
+    for name in inputs:
+        for skip_lint, skip_type, label in ((True, True, "features"),
+                                            (False, True, "lint"),
+                                            (True, False, "type"),
+                                            (False, False, "all")):
+            benchmarks[f"valid.validate_package[{name},{label}]"] = \
+                _bench_validate(files[name], skip_lint, skip_type)
+    sb_dirname = os.path.join(dirname, "pset1")
+    benchmarks["SafeFunction.capture[noop]"] = _bench_capture(
+        sb_dirname, _noop, "")
+    n_lines = 1000 * scale
+    stdin = f"{n_lines}\n" + "1\n" * n_lines
+    benchmarks["SafeFunction.capture[stdin]"] = _bench_capture(
+        sb_dirname, _sum_lines, stdin)
+    for size in (n_lines, 20 * n_lines):
+        benchmarks[f"Suppressor[{size}]"] = _bench_suppressor(size)
+    benchmarks["Case.run[pset1]"] = _bench_case(
+        sb_dirname, _load_function(inputs["pset1"], "problem_2"), None,
+        "3\n5", "11\n")
+    benchmarks["Case.run[pset1,group]"] = _bench_group(
+        sb_dirname, _load_function(inputs["pset1"], "problem_2"), None,
+        "3\n5", "11\n", 300)
+    benchmarks["Case.run[stdin]"] = _bench_case(
+        sb_dirname, _sum_lines, n_lines, stdin, f"{n_lines}\n")
+    benchmarks["Case.run[timeout]"] = _bench_case(
+        sb_dirname, _spin, None, "", "", calibrate=False)
+    for name in inputs:
+        benchmarks[f"ErrorFormatter.format_all[{name}]"] = \
+            _bench_format_all(files[name])
+    benchmarks["Writer.finalize[pset1]"] = _bench_finalize(
+        os.path.join(dirname, "write"), inputs["pset1"], 1)
+    benchmarks["Writer.finalize[large]"] = _bench_finalize(
+        os.path.join(dirname, "write"), inputs["large"], 20 * scale)
+    return benchmarks
+
+
+def run_benchmarks(benchmarks: Dict[str, Benchmark], patterns: List[str],
+                   repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, (prepare, calibrate) in benchmarks.items():
+        if patterns and not any(pattern in name for pattern in patterns):
+            continue
+        results[name] = measure(prepare, repeat, calibrate=calibrate)
+        print(f"{name:>48} | {_format_seconds(results[name]['min'])}",
+              file=sys.stderr)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]],
+            baseline: Dict[str, Dict[str, Any]],
+            threshold: float) -> Tuple[str, List[str]]:
+    """
+    Return a table of the change in the minimum time of each benchmark from
+    |baseline| and the names of those slower by more than |threshold|.
+    """
+    fmt_str = "{0:>48} | {1:>10} | {2:>10} | {3:>8}"
+    lines = [fmt_str.format("", "before", "after", "change")]
+    regressions = []
+    for name in sorted(set(results) & set(baseline)):
+        before = baseline[name]["min"]
+        after = results[name]["min"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " " + utils.colorize("*", color="red")
+        lines.append(fmt_str.format(name, _format_seconds(before),
+                                    _format_seconds(after),
+                                    f"{change:+.1%}") + flag)
+    return "\n".join(lines), regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, factor in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= factor:
+            return f"{seconds / factor:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def _get_commit() -> str:
+    process = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             cwd=utils.get_top_dirname(),
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             universal_newlines=True)
+    return process.stdout.strip()
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=
+    """Casey Grading Stage Benchmarks""")
+    parser.add_argument("-c", "--compare", default="")
+    parser.add_argument("-k", "--keyword", action="append", default=[])
+    parser.add_argument("-o", "--output", default="")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-s", "--scale", type=int, default=1)
+    parser.add_argument("-t", "--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    # the sandbox echoes the output of submissions to stdout
+    with tempfile.TemporaryDirectory() as dirname, \
+            open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        benchmarks = get_benchmarks(dirname, args.scale)
+        results = run_benchmarks(benchmarks, args.keyword, args.repeat)
+    report = {"commit": _get_commit(), "python": platform.python_version(),
+              "scale": args.scale, "results": results}
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as fp:
+            baseline = json.load(fp)
+        table, regressions = compare(results, baseline["results"],
+                                     args.threshold)
+        print(f"\n[{baseline['commit']} -> {report['commit']}]\n" + table,
+              file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,41 @@
 import datetime
-import glob
 import hashlib
-import json
 import os
 import pprint
+import sys
 import time
 import traceback
-from typing import Tuple
+from typing import Dict, Iterator, Tuple
 
 import flask
 import werkzeug
 
 from src import casey
+from src import error
+from src import gradebook
+from src import metrics
+from src import tracelog
 from src import utils
-from src.grade import grade
+from src.rules import snapshot
+from src.serve import jobs
+from src.serve import zygote
 from typing import Set
 
 
 app = flask.Flask(__name__)
+supervisor = None
+if os.environ.get("CASEY_ZYGOTE") == "1":
+    supervisor = zygote.Supervisor(os.path.abspath("casey.sock"),
+                                   int(os.environ.get("CASEY_GRADERS", 10)))
+    supervisor.start()
+is_streaming = os.environ.get("CASEY_STREAM") == "1"
 
 
 class Lock(object):
+    """
+    Reject overlapping submissions when grading in the server worker. The
+    zygote coalesces overlapping submissions itself and does not use this.
+    """
 
     def __init__(self, course: str, assignment: str, username: str) -> None:
         dirname = utils.get_submit_dirname(course, assignment, username)
@@ -48,7 +63,7 @@ class Lock(object):
 @app.route("/<owner>/<course>/<assignment>/", methods=["GET"])
 def get_filenames(owner: str, course: str, assignment: str) -> str:
     _validate_request(owner)
-    filenames = utils.get_filenames(course, assignment)
+    filenames = snapshot.get_filenames(course, assignment)
     if not filenames:
         return ""
     return " ".join(filenames) + "\n"
@@ -65,17 +80,65 @@ def receive_files(owner: str, course: str, assignment: str, username: str,
             if not _is_valid_ext(filename):
                 raise Exception(f"Invalid file type: {filename}")
             files[filename] = fp.read().decode()
+        if supervisor and flask.request.args.get("async"):
+            job_id = supervisor.submit(course, assignment, username, files)
+            return f"Job ID: {job_id}\n"
+        if is_streaming:
+            return flask.Response(flask.stream_with_context(
+                _stream(course, assignment, username, files)),
+                mimetype="text/plain")
+        if supervisor:
+            return supervisor.run(course, assignment, username, files)
         with Lock(course, assignment, username):
-            return casey.run(course, assignment, username, files)
+            with metrics.timer("total"):
+                output = casey.run(course, assignment, username, files)
+        _log_record(course, assignment, username)
+        return output
     except FileExistsError:
-        return (f"[{username}] has an active submission.\n"
-                "Please wait until it completes and try again.\n")
+        return _get_active_message(username)
     except:
-        with open("log.txt", "a") as fp:
-            fp.write(f"[{datetime.datetime.now()}] {username}\n")
-            fp.write(traceback.format_exc() + "\n" * 4)
-        return ("Casey encountered an unexpected error.\n" +
-                "Please contact your instructor for assistance.\n")
+        return _log_error(course, assignment, username)
+
+
+def _stream(course: str, assignment: str, username: str,
+            files: Dict[str, str]) -> Iterator[str]:
+    """Yield the output of a submission as it is graded."""
+    try:
+        if supervisor:
+            yield from supervisor.stream(course, assignment, username, files)
+        else:
+            with Lock(course, assignment, username):
+                with metrics.timer("total"):
+                    yield from casey.stream(course, assignment, username,
+                                            files)
+            _log_record(course, assignment, username)
+    except FileExistsError:
+        yield _get_active_message(username)
+    except:
+        yield _log_error(course, assignment, username)
+
+
+def _get_active_message(username: str) -> str:
+    return (f"[{username}] has an active submission.\n"
+            "Please wait until it completes and try again.\n")
+
+
+def _log_record(course: str, assignment: str, username: str) -> None:
+    """Log the trace of a submission graded by this worker."""
+    tracelog.write(tracelog.make_record(course, assignment, username, "done"))
+    tracelog.flush()
+
+
+def _log_error(course: str, assignment: str, username: str) -> str:
+    """Log the current exception and return the message shown to the user."""
+    # errors raised while grading in the zygote are logged by the zygote
+    if not (supervisor and isinstance(sys.exc_info()[1],
+                                      error.CaseyRuntimeError)):
+        tracelog.write(tracelog.make_record(course, assignment, username,
+                                            "error", is_traced=False,
+                                            traceback=traceback.format_exc()))
+    return ("Casey encountered an unexpected error.\n" +
+            "Please contact your instructor for assistance.\n")
 
 
 def _validate_request(owner: str, username: str = "", key: str = "") -> None:
@@ -86,6 +149,13 @@ def _validate_request(owner: str, username: str = "", key: str = "") -> None:
         raise Exception("Unrecognized submission protocol")
 
 
+def _validate_admin(owner: str, username: str, key: str) -> None:
+    """Validate the request and ensure it was made by the server's owner."""
+    _validate_request(owner, username=username, key=key)
+    if username != utils.get_admin_name():
+        raise Exception("Administrator access required")
+
+
 def _validate_key(username: str, key: str, key_file: str = "key.txt") -> bool:
     """Return True if key is valid False otherwise."""
     now = datetime.datetime.now()
@@ -102,21 +172,36 @@ def _is_valid_ext(filename: str, exts: Tuple[str] = (".py", )) -> bool:
     return os.path.splitext(filename)[1] in exts
 
 
+@app.route("/<owner>/<username>/<key>/<course>/<assignment>/<job_id>/",
+           methods=["GET"])
+def get_job(owner: str, username: str, key: str, course: str, assignment: str,
+            job_id: str) -> str:
+    try:
+        _validate_request(owner, username=username, key=key)
+        record = jobs.read_status(course, assignment, username, job_id)
+        if record is None:
+            return f"Job Not Found: {job_id}\n"
+        if record["status"] == "done":
+            return record["output"]
+        if record["status"] == "error":
+            return ("Casey encountered an unexpected error.\n" +
+                    "Please contact your instructor for assistance.\n")
+        return f"Job Status: {record['status']}\n"
+    except Exception:
+        return "Casey job error\n"
+
+
 @app.route("/<owner>/<username>/<key>/<course>/", methods=["GET"])
 def get_scores(owner: str, username: str, key: str, course: str) -> str:
     try:
         _validate_request(owner, username=username, key=key)
-        paths = glob.glob(os.path.join(utils.get_root_dirname(), course, "*",
-                                       username, "scores.json"))
         totals = {}
-        for path in paths:
-            assignment = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        for assignment, total in gradebook.Gradebook().get_totals(
+                course, username).items():
 
             if assignment not in []:  # TODO: move to config
 
-                with open(path, "r") as fp:
-                    total = int(grade.get_total(json.load(fp)) * 100)
-                    totals[assignment] = f"{total}%"
+                totals[assignment] = f"{int(total * 100)}%"
         table = str.maketrans({"{": " ", "}": "\n", "'": "", ",": ""})
         return pprint.pformat(totals).translate(table)
     except Exception as e:
@@ -124,5 +209,28 @@ def get_scores(owner: str, username: str, key: str, course: str) -> str:
         return "Casey summary error\n"
 
 
+@app.route("/<owner>/<username>/<key>/status/", methods=["GET"])
+def get_status(owner: str, username: str, key: str) -> str:
+    try:
+        _validate_admin(owner, username, key)
+        status = {"mode": "zygote" if supervisor else "direct"}
+        if supervisor:
+            status.update(supervisor.stats())
+        return pprint.pformat(status) + "\n"
+    except Exception:
+        return "Casey status error\n"
+
+
+@app.route("/<owner>/<username>/<key>/metrics/", methods=["GET"])
+def get_metrics(owner: str, username: str, key: str) -> flask.Response:
+    try:
+        _validate_admin(owner, username, key)
+        text = (supervisor.metrics() if supervisor
+                else "# metrics are only collected by the zygote (ZYGOTE=1)\n")
+    except Exception:
+        text = "# Casey metrics error\n"
+    return flask.Response(text, mimetype="text/plain")
+
+
 if __name__ == "__main__":
     app.run(port=5005)
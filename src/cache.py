@@ -0,0 +1,157 @@
+import configparser
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, Optional, Tuple
+
+from src import utils
+
+
+class DiskCache(object):
+    """
+    A size-bounded cache of JSON values stored as one file per key. Reading an
+    entry refreshes its modification time so that the least recently used
+    entries are evicted first. Entries that cannot be read or written are
+    treated as missing, so that the cache never fails grading.
+    """
+
+    def __init__(self, dirname: str, max_entries: int = 500) -> None:
+        self.dirname: str = dirname
+        self.max_entries: int = max_entries
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._get_path(key)
+        try:
+            with open(path, "r") as fp:
+                value = json.load(fp)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._get_path(key)
+        try:
+            os.makedirs(self.dirname, mode=0o700, exist_ok=True)
+            with open(path + ".tmp", "w") as fp:
+                json.dump(value, fp)
+            os.chmod(path + ".tmp", 0o600)
+            os.replace(path + ".tmp", path)
+            self._evict()
+        except OSError:
+            try:
+                os.remove(path + ".tmp")
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        shutil.rmtree(self.dirname, ignore_errors=True)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.dirname, key + ".json")
+
+    def _evict(self) -> None:
+        paths = [os.path.join(self.dirname, name)
+                 for name in os.listdir(self.dirname) if name.endswith(".json")]
+        if len(paths) <= self.max_entries:
+            return
+        # entries may be evicted by another grader at the same time
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except FileNotFoundError:
+                pass
+        paths = sorted(mtimes, key=mtimes.get)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ResultCache(DiskCache):
+    """
+    Cache of graded results for an assignment. Entries are stored under a
+    fingerprint of the test cases, every rule and tool config that affects
+    grading, and |versions| (e.g. of the result format and of the tools), so
+    that changing any of them invalidates all previous results.
+    """
+
+    def __init__(self, course: str, assignment: str,
+                 config: configparser.ConfigParser,
+                 versions: Tuple[Any, ...] = (),
+                 max_entries: int = 500) -> None:
+        parent = os.path.join(utils.get_cache_dirname(course, assignment),
+                              "results")
+        self.fingerprint: str = _fingerprint(course, assignment, config,
+                                             versions)
+        super().__init__(os.path.join(parent, self.fingerprint), max_entries)
+        if os.path.isdir(parent):
+            for name in os.listdir(parent):
+                if name != self.fingerprint:
+                    shutil.rmtree(os.path.join(parent, name),
+                                  ignore_errors=True)
+
+
+class FunctionCache(object):
+    """
+    The feature validation errors of each function in a user's latest
+    submission, keyed by the function's source and the rules it was validated
+    against, so that a resubmission only validates new or changed functions.
+    Only the entries used by the latest submission are saved.
+    """
+
+    def __init__(self, course: str, assignment: str, username: str) -> None:
+        self.path: str = os.path.join(
+            utils.get_cache_dirname(course, assignment), "functions",
+            username + ".json")
+        self.entries: Dict[str, Any] = {}
+        self.used: Dict[str, Any] = {}
+        try:
+            with open(self.path, "r") as fp:
+                self.entries = json.load(fp)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is not None:
+            self.used[key] = value
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.used[key] = value
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        with open(self.path + ".tmp", "w") as fp:
+            json.dump(self.used, fp)
+        os.chmod(self.path + ".tmp", 0o600)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def make_key(*parts: Any) -> str:
+    """Return a hash of the JSON representation of the given values."""
+    text = json.dumps(parts, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _fingerprint(course: str, assignment: str,
+                 config: configparser.ConfigParser,
+                 versions: Tuple[Any, ...]) -> str:
+    sections = {section: dict(config.items(section, raw=True))
+                for section in config.sections()}
+    sources = []
+    paths = [utils.get_cases_path(course, assignment)]
+    for filename in ("pylint.cfg", "mypy.cfg"):
+        try:
+            paths.append(utils.get_cfg_path(course, assignment, filename))
+        except FileNotFoundError:
+            pass
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "r") as fp:
+                sources.append(fp.read())
+    return make_key(sections, sources, versions)
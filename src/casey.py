@@ -2,71 +2,234 @@ import copy
 import datetime
 import os
 import sys
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from src import cache
 from src import error
+from src import metrics
 from src import utils
 from src import write
 from src.grade import grade
 from src.grade import suite
-from src.rules import access
-from src.rules import langfeat
-from src.rules import rules
+from src.rules import snapshot
 from src.sandbox import safepkg
+from src.static import analysis
+
+
+# incremented when the format of cached results changes
+RESULT_VERSION = 2
+
+# the errors of results that are not cached
+UNCACHEABLE = (error.CaseyTimeoutError.__name__,
+               error.CaseyRuntimeError.__name__,
+               error.InvalidCaseFunctionError.__name__,
+               "MemoryError: Process exceeded",
+               grade.NOT_READY,
+               grade.TERMINATED)
 
 
 # TODO: read min_tests from cfg
 def run(course: str, assignment: str, username: str, files: Dict[str, str],
-        min_tests: int = 5, is_admin: bool = False) -> str:
-    now = datetime.datetime.now()
+        min_tests: int = 5, is_admin: bool = False,
+        now: Optional[datetime.datetime] = None,
+        overwrite: bool = False) -> str:
+    """
+    Grade the submitted files and return the output shown to the user.
+
+    A regrade passes the time of the original submission as |now| and
+    |overwrite| to replace the user's best scores even if the new total is
+    lower.
+    """
+    return "".join(_submit(course, assignment, username, files,
+                           min_tests=min_tests, is_admin=is_admin, now=now,
+                           overwrite=overwrite))
+
+
+def stream(course: str, assignment: str, username: str, files: Dict[str, str],
+           **kwargs) -> Iterator[str]:
+    """
+    Grade the submitted files like |run|, but yield any validation errors as
+    soon as validation completes and each group's score as soon as the group
+    completes. Errors from the cases follow the total score.
+    """
+    return _submit(course, assignment, username, files, is_streaming=True,
+                   **kwargs)
+
+
+def _submit(course: str, assignment: str, username: str, files: Dict[str, str],
+            min_tests: int = 5, is_admin: bool = False,
+            now: Optional[datetime.datetime] = None, overwrite: bool = False,
+            is_streaming: bool = False) -> Iterator[str]:
+    metrics.start_trace()
+    now = now or datetime.datetime.now()
     if not files:
         raise error.FileNamesNotSpecified(" ".join(files))
+    metrics.annotate(files={name: len(source.encode())
+                            for name, source in files.items()})
     if not _dir_exists(course, assignment):
-        return "Invalid course number or assignment name\n"
+        metrics.annotate(outcome="invalid")
+        yield "Invalid course number or assignment name\n"
+        return
 
     files = _update_file_paths(course, assignment, username, files)
-    writer = write.Writer(files)
+    with metrics.timer("write"):
+        writer = write.Writer(files)
 
-    config = rules.load_config(course, assignment)
-    due_datetime, is_open, penalty = access.load_access(config, username, now)
+    with metrics.timer("config"):
+        snap = snapshot.load(course, assignment)
+    due_datetime, is_open, penalty = snap.access.load(username, now)
     if not is_open and not is_admin:
-        return f"Submission Closed: {course} {assignment}\n"
+        metrics.annotate(outcome="closed")
+        yield f"Submission Closed: {course} {assignment}\n"
+        return
+
+    is_quiz = assignment.startswith("quiz") or assignment == "final"
+    results = cache.ResultCache(course, assignment, snap.config,
+                                versions=(RESULT_VERSION,)
+                                + analysis.TOOL_VERSIONS)
+    key = cache.make_key(RESULT_VERSION, _get_sources(files), penalty,
+                         min_tests, is_admin)
+    graded = results.get(key)
+    is_cached = graded is not None
+    metrics.annotate(cache="hit" if is_cached else "miss")
+    if not is_cached:
+        groups = {}
+        for event, value in _grade(course, assignment, username, files, snap,
+                                   penalty, min_tests, is_admin):
+            if event == "message":
+                metrics.annotate(outcome="incomplete")
+                yield value
+                return
+            elif event == "graded":
+                graded = value
+            elif not is_streaming:
+                continue
+            elif event == "validated":
+                yield value
+            elif event == "groups":
+                groups = dict.fromkeys(value, 0.0)
+            elif event == "score" and not is_quiz:
+                yield _format_score(groups, *value)
+        if _is_cacheable(graded):
+            results.put(key, graded)
+    scores = {(name, weight): score for name, weight, score in graded["scores"]}
+    result = tuple(graded["result"]) or {}
+    if is_streaming and is_cached:
+        yield graded["validation"]
+        if not is_quiz:
+            for key, score in scores.items():
+                yield _format_score(scores, key, score)
+    with metrics.timer("write"):
+        if result:
+            writer.write_scores(scores, result)
+        if graded["errors"]:
+            writer.write_errors(graded["errors"])
+    if is_quiz:
+        threshold = 0.2
+        # TODO: find out how result could be empty
+        score_table = ("\n" + utils.colorize("[WARNING]", color="red")
+                       + f" Total Score < {int(threshold * 100)}%"
+                       if not result or result[1] < threshold else "")
+    else:
+        score_table = grade.format_scores(scores, result)
+    is_success = False
+    with metrics.timer("write"):
+        if result and (overwrite
+                       or grade.is_best(result[1], writer.load_scores())
+                       or is_quiz):
+            is_success = True
+            writer.finalize()
+    metrics.annotate(outcome="graded", score=result[1] if result else None,
+                     is_success=is_success)
+    if is_streaming:
+        if scores and not is_quiz:
+            # only the separator and total remain of the score table
+            score_table = "\n".join(score_table.splitlines()[-2:]) + "\n"
+        yield _join_output(graded["cases"], score_table, is_success,
+                           due_datetime, errors_first=False)
+    else:
+        yield _join_output(graded["visible"], score_table, is_success,
+                           due_datetime)
+
+
+def _grade(course: str, assignment: str, username: str,
+           files: Dict[str, str], snap: snapshot.Snapshot,
+           penalty: float, min_tests: int,
+           is_admin: bool) -> Iterator[Tuple[str, Any]]:
+    """
+    Validate the package and run its test cases, yielding events as grading
+    progresses:
 
-    feat_rules = langfeat.load_features(config, tuple(files))
+         ("validated", str): the visible errors found by validation
+          ("groups", list): the (name, weight) of each group of cases
+        ("score", (key, score)): the score of a group once it completes
+          ("graded", dict): the scores and formatted errors
+          ("message", str): a message if grading could not be completed
+    """
+    feat_rules = snap.get_features(tuple(files))
     try:
         # TODO: add params in admin.py for skip_* options
-        pkg = safepkg.SafePackage(course, assignment, files, min_tests,
-                                  feat_rules, skip_lint=is_admin,
-                                  skip_type=is_admin)
+        with metrics.timer("package"):
+            pkg = safepkg.SafePackage(
+                course, assignment, files, min_tests, feat_rules,
+                skip_lint=is_admin, skip_type=is_admin, load=False,
+                functions=cache.FunctionCache(course, assignment, username),
+                memory_limit=snap.limits.memory,
+                wall_limit=snap.limits.case_time)
     except SyntaxError:
         filenames = tuple(os.path.basename(path) for path in files)
-        return error.filter_traceback(filenames, *sys.exc_info())
+        yield "message", error.filter_traceback(filenames, *sys.exc_info())
+        return
+    validated = pkg.errors.get_visible()
+    validation = pkg.errors.format_visible()
+    yield "validated", validation
+    pkg.sandbox.set_deadline("Submission", snap.limits.submission_time)
+    pkg.load_modules(min_tests)
     scores = {}
-    result = {}
+    result = ()
     if pkg.is_loaded():
         case_path = os.path.join(utils.get_top_dirname(), "cases", course,
                                  assignment, "cases.py")
         if not os.path.exists(case_path):
-            return "Test cases not yet ready, try again later\n"
+            yield "message", "Test cases not yet ready, try again later\n"
+            return
         # TODO: change to score, (label, total)
-        scores, result = grade.run_cases(pkg, case_path, penalty)
-        writer.write_scores(scores, result)
-    if pkg.errors.has_any():
-        writer.write_errors(pkg.errors.format_all())
-    if assignment.startswith("quiz") or assignment == "final":
-        threshold = 0.2
-        # TODO: find out how result could be empty
-        score_table = ("\n" + utils.colorize("[WARNING]", color="red")
-                       + f" Total Score < {int(threshold * 100)}%"
-                       if not result or result[1] < threshold else "")
-    else:
-        score_table = grade.format_scores(scores, result)
-    is_success = False
-    if pkg.is_loaded() and (grade.is_best(result[1], writer.load_scores())
-                    or assignment.startswith("quiz") or assignment == "final"):
-        is_success = True
-        writer.finalize()
-    return _join_output(pkg.errors, score_table, is_success, due_datetime)
+        groups = suite.load_cases(case_path, pkg)
+        yield "groups", list(groups)
+        for key, score in grade.iter_cases(
+                pkg, groups, group_time=snap.limits.group_time):
+            scores[key] = score
+            yield "score", (key, score)
+        result = grade.get_result(scores, penalty)
+    yield "graded", {
+        "scores": [[name, weight, score]
+                   for (name, weight), score in scores.items()],
+        "result": list(result),
+        "errors": pkg.errors.format_all() if pkg.errors.has_any() else "",
+        "visible": pkg.errors.format_visible(),
+        "validation": validation,
+        "cases": pkg.errors.format_visible(exclude=validated)}
+
+
+def _format_score(weighted_scores: Dict[Tuple[str, float], float],
+                  key: Tuple[str, float], score: float) -> str:
+    """Format a streamed line of the score table."""
+    line = grade.format_score(weighted_scores, key, score) + "\n"
+    return "\n" + line if key == next(iter(weighted_scores)) else line
+
+
+def _get_sources(files: Dict[str, str]) -> Dict[str, str]:
+    return {os.path.basename(path): source for path, source in files.items()}
+
+
+def _is_cacheable(graded: Dict[str, Any]) -> bool:
+    """
+    Return False if the results may depend on the server rather than the
+    submission (i.e. a group had no cases, a case timed out or exceeded its
+    memory, a child running cases was killed, or Casey failed) and True
+    otherwise.
+    """
+    return not any(marker in graded["errors"] for marker in UNCACHEABLE)
 
 
 def _dir_exists(course: str, assignment: str) -> bool:
@@ -85,12 +248,15 @@ def _update_file_paths(course: str, assignment: str, username: str,
             for filename, source in files.items()}
 
 
-def _join_output(errors: error.ErrorFormatter, score_table: str,
-                 is_success: bool, due_datetime: datetime.datetime) -> str:
+def _join_output(errors: str, score_table: str, is_success: bool,
+                 due_datetime: datetime.datetime,
+                 errors_first: bool = True) -> str:
     """
     Concatenate errors, scores, and submission status into one string.
     """
-    return (errors.format_visible()
+    if not errors_first:
+        errors, score_table = score_table, errors and "\n" + errors
+    return (errors
             + score_table
             + _format_status(is_success)
             + _get_due_message(due_datetime))
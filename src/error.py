@@ -1,7 +1,7 @@
 import os
 import re
 import traceback
-from typing import Dict, List, Set, Tuple, Type
+from typing import Dict, List, Optional, Set, Tuple, Type
 
 
 ExcInfo = Tuple[Type[BaseException], BaseException,
@@ -92,11 +92,37 @@ class ErrorFormatter(object):
         self.add(name, header, hidden=hidden)
         self.add_traceback(name, exc_info)
 
+    def merge(self, other: "ErrorFormatter") -> None:
+        """Add the errors of |other|, which was created for the same files."""
+        for source, target in ((other._to_write, self._to_write),
+                               (other._to_print, self._to_print)):
+            for name, messages in source.items():
+                for message, linenos in messages.items():
+                    target.setdefault(name, {})
+                    target[name].setdefault(message, set()).update(linenos)
+
     def format_all(self) -> str:
         return self._format(self._to_write)
 
-    def format_visible(self) -> str:
-        return self._format(self._to_print) if self.has_visible() else ""
+    def format_visible(self,
+                       exclude: Optional[Dict[str, Set[str]]] = None) -> str:
+        """
+        Format the visible errors, omitting any messages in |exclude| (e.g.
+        those already shown, as returned by |get_visible|).
+        """
+        errors = self._to_print
+        if exclude:
+            errors = {name: {message: linenos
+                             for message, linenos in messages.items()
+                             if message not in exclude.get(name, ())}
+                      for name, messages in errors.items()}
+            errors = {name: messages for name, messages in errors.items()
+                      if messages}
+        return self._format(errors) if errors else ""
+
+    def get_visible(self) -> Dict[str, Set[str]]:
+        """Return the messages of each visible error added so far."""
+        return {name: set(messages) for name, messages in self._to_print.items()}
 
     def _format(self, errors) -> str:
         blocks = []
@@ -25,10 +25,12 @@ class Case(object):
         self.exc_info = e
         self.header: str = self._init_header(f, args, s, t)
         self.stdout: str = ""
+        self.peak_memory: int = 0
 
     def run(self):
         random.seed(self.seed)
         result = self.call()
+        self.peak_memory = result.peak_memory
         if any(result.exc_info):
             is_exc = (isinstance(self.expect[0], type)
                       and issubclass(self.expect[0], BaseException))
@@ -1,8 +1,44 @@
-from typing import Dict, Optional, Tuple
+import math
+import multiprocessing.connection
+import os
+import signal
+import sys
+import time
+import traceback
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from src import error
+from src import metrics
+from src.grade import case
 from src.grade import suite
 from src.sandbox import safepkg
+from src.sandbox.ctxman import timer
+
+
+# the number of submissions graded at once, which share the cores
+GRADERS = int(os.environ.get("CASEY_GRADERS", 0))
+
+# the number of forked children that run the cases of a submission at once
+# (1 runs them in the grading process), by default each grader's share of the
+# cores so that busy graders do not oversubscribe them
+WORKERS = (int(os.environ.get("CASEY_CASE_WORKERS", 0))
+           or (GRADERS and max(1, len(os.sched_getaffinity(0)) // GRADERS))
+           or 1)
+
+# the fewest cases run by a child, since forking costs more than most cases
+MIN_CHUNK = 25
+
+# the seconds a child may run past the deadline of its cases before it is
+# killed (e.g. if it is stuck where its own timers cannot stop it), besides
+# the time each of its cases is still given once the deadline has passed
+KILL_GRACE = 2.0
+
+# the errors of groups whose results depend on the server
+NOT_READY = "Test cases not yet ready, try again later"
+TERMINATED = "Test cases terminated unexpectedly"
+
+Connection = multiprocessing.connection.Connection
+Key = Tuple[str, float]
 
 
 def run_cases(pkg: safepkg.SafePackage, case_path: str,
@@ -10,25 +46,201 @@ def run_cases(pkg: safepkg.SafePackage, case_path: str,
     """
     Side-effects: Adds any errors encountered to pkg.errors.
     """
-    weighted_scores = {}
-    cases = suite.load_cases(case_path, pkg)
+    groups = suite.load_cases(case_path, pkg)
+    weighted_scores = dict(iter_cases(pkg, groups))
+    return weighted_scores, get_result(weighted_scores, penalty)
+
+
+def iter_cases(pkg: safepkg.SafePackage,
+               groups: Dict[Key, List[case.Case]], workers: int = WORKERS,
+               group_time: int = 0) -> Iterator[Tuple[Key, float]]:
+    """
+    Run the cases of each group and yield the group's score as soon as the
+    group completes.
+
+    If |workers| > 1, chunks of each group's cases run in up to |workers|
+    forked children of the loaded package at once. Scores are still yielded
+    and errors still added in the order of the groups and their cases, but
+    cases in later chunks do not see any state (e.g. module globals) left by
+    the cases of earlier chunks.
+
+    If |group_time|, cases still running |group_time| seconds after their
+    group started are stopped as if they timed out. A forked child still
+    running well after the group or submission deadline has passed (e.g.
+    stuck where its timers cannot stop it) is killed, and its cases are
+    reported as terminated.
+
+    Side-effects: Adds any errors encountered to pkg.errors.
+    """
     # TODO: raise error on duplicate case names
-    for (name, weight), cases in cases.items():
+    if workers > 1:
+        yield from _iter_forked(pkg, groups, workers, group_time)
+        return
+    for (name, weight), cases in groups.items():
         if not cases:
-            pkg.errors.add(name, "Test cases not yet ready, try again later",
-                           hidden=False)
-            weighted_scores[(name, weight)] = 0
+            pkg.errors.add(name, NOT_READY, hidden=False)
+            yield (name, weight), 0
         else:
+            pkg.sandbox.set_deadline("Group", group_time)
+            with metrics.timer("group:" + name):
+                n_pass, n_timeouts, peak = _run_cases(pkg, pkg.errors, name,
+                                                      cases)
+            _count(len(cases), n_pass, n_timeouts, peak)
+            yield (name, weight), n_pass / len(cases)
+
+
+def _run_cases(pkg: safepkg.SafePackage, errors: error.ErrorFormatter,
+               name: str, cases: List[case.Case]) -> Tuple[int, int, int]:
+    """
+    Run the cases of the group |name| in one sandbox session, adding the
+    errors of failed cases to |errors|. Return the number of cases passed
+    and timed out and the peak bytes of memory used by a case.
+    """
+    n_pass = 0
+    n_timeouts = 0
+    peak = 0
+    with pkg.sandbox.session():
+        for case in cases:
+            case.run()
+            peak = max(peak, case.peak_memory)
+            if case.passed:
+                n_pass += 1
+            else:
+                errors.add_case(name, case.header, case.exc_info, case.hidden)
+                if case.exc_info[0] is error.CaseyTimeoutError:
+                    n_timeouts += 1
+    return n_pass, n_timeouts, peak
+
+
+def _count(n_cases: int, n_pass: int, n_timeouts: int, peak: int) -> None:
+    if n_timeouts:
+        metrics.increment("timeouts", n_timeouts)
+    metrics.increment("cases", n_cases)
+    metrics.increment("passed", n_pass)
+    metrics.update_max("peak_case_memory_kb", peak // 1024)
+
+
+def _iter_forked(pkg: safepkg.SafePackage, groups: Dict[Key, List[case.Case]],
+                 workers: int,
+                 group_time: int) -> Iterator[Tuple[Key, float]]:
+    """Run the cases like |iter_cases|, but in forked children."""
+    chunks = []  # (key, cases) in the order their results are merged
+    for key, cases in groups.items():
+        size = max(MIN_CHUNK, math.ceil(len(cases) / workers))
+        for start in range(0, len(cases), size):
+            chunks.append((key, cases[start:start + size]))
+    results = {}  # chunk index -> (n_pass, n_timeouts, peak, errors or None)
+    spans = {}  # group key -> [first chunk started, last chunk finished]
+    running = {}  # reader -> (pid, chunk index, time.monotonic() to kill)
+    pending = 0
+    try:
+        for key, cases in groups.items():
+            if not cases:
+                pkg.errors.add(key[0], NOT_READY, hidden=False)
+                yield key, 0
+                continue
+            indexes = [i for i, (chunk_key, _) in enumerate(chunks)
+                       if chunk_key == key]
+            while any(i not in results for i in indexes):
+                while pending < len(chunks) and len(running) < workers:
+                    chunk_key, chunk = chunks[pending]
+                    if chunk_key not in spans:
+                        # the children inherit the deadline of the group
+                        pkg.sandbox.set_deadline("Group", group_time)
+                        spans[chunk_key] = [time.perf_counter(), 0.0]
+                    reader, pid = _start(pkg, chunk_key[0], chunk)
+                    deadline = pkg.sandbox.get_deadline()
+                    if deadline:
+                        deadline += KILL_GRACE + timer.INTERVAL * len(chunk)
+                    running[reader] = (pid, pending, deadline)
+                    pending += 1
+                ready = multiprocessing.connection.wait(
+                    list(running), _get_timeout(running.values()))
+                now = time.monotonic()
+                for reader, (pid, index, deadline) in list(running.items()):
+                    if reader not in ready:
+                        if not deadline or now < deadline:
+                            continue
+                        # the child reports no result and is TERMINATED
+                        os.kill(pid, signal.SIGKILL)
+                    del running[reader]
+                    results[index] = _join(pid, reader)
+                    spans[chunks[index][0]][1] = time.perf_counter()
             n_pass = 0
-            for case in cases:
-                case.run()
-                if case.passed:
-                    n_pass += 1
+            for index in indexes:
+                passed, n_timeouts, peak, found = results.pop(index)
+                if found is None:
+                    pkg.errors.add(key[0], TERMINATED, hidden=False)
                 else:
-                    pkg.errors.add_case(name, case.header, case.exc_info,
-                                        case.hidden)
-            weighted_scores[(name, weight)] = n_pass / len(cases)
-    return weighted_scores, _get_result(weighted_scores, penalty)
+                    pkg.errors.merge(found)
+                n_pass += passed
+                _count(len(chunks[index][1]), passed, n_timeouts, peak)
+            metrics.record("group:" + key[0], spans[key][1] - spans[key][0])
+            yield key, n_pass / len(cases)
+    finally:
+        for reader, (pid, _, _) in running.items():
+            os.kill(pid, signal.SIGKILL)
+            reader.close()
+            os.waitpid(pid, 0)
+
+
+def _get_timeout(running: Iterable[Tuple[int, int, float]]
+) -> Optional[float]:
+    """
+    Return the seconds until the first of the running children must be
+    killed, or None if none of them has a deadline.
+    """
+    deadlines = [deadline for _, _, deadline in running if deadline]
+    if not deadlines:
+        return None
+    return max(0.0, min(deadlines) - time.monotonic())
+
+
+def _start(pkg: safepkg.SafePackage, name: str,
+           cases: List[case.Case]) -> Tuple[Connection, int]:
+    """
+    Run the cases of the group |name| in a forked child, which sends back the
+    number of cases passed and timed out, the peak memory used by a case, and
+    the errors of the failed cases (or the traceback of the exception
+    raised).
+    """
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reader.close()
+            found = error.ErrorFormatter({sm.path: sm.source
+                                          for sm in pkg.safemods})
+            try:
+                n_pass, n_timeouts, peak = _run_cases(pkg, found, name, cases)
+            except BaseException:
+                writer.send((0, 0, 0, None, traceback.format_exc()))
+            else:
+                writer.send((n_pass, n_timeouts, peak, found, ""))
+            sys.stdout.flush()
+        finally:
+            os._exit(0)
+    writer.close()
+    return reader, pid
+
+
+def _join(pid: int, reader: Connection
+) -> Tuple[int, int, int, Optional[error.ErrorFormatter]]:
+    """
+    Wait for the child and return the number of cases passed and timed out,
+    the peak memory used by a case, and the errors found, or no errors if the
+    child exited without a result (e.g. it was killed).
+    """
+    try:
+        n_pass, n_timeouts, peak, found, exc = reader.recv()
+    except EOFError:
+        return 0, 0, 0, None
+    finally:
+        reader.close()
+        os.waitpid(pid, 0)
+    if exc:
+        raise error.CaseyRuntimeError(exc)
+    return n_pass, n_timeouts, peak, found
 
 
 def get_total(scores: Dict[str, float]) -> float:
@@ -47,31 +259,48 @@ def is_best(current_total: float, previous: Optional[Dict[str, float]]) -> bool:
 def format_scores(weighted_scores, result: Tuple[str, float]) -> str:
     if not weighted_scores:
         return ""
-    weighted_scores = _remove_shared_prefix(weighted_scores)
-    width = len(max(weighted_scores, key=lambda s: len(s[0]))[0]) + 1
-    fmt_str = "{0:>" + str(width) + "} | {1:>3}%"
-    lines = []
-    for (name, weight), score in weighted_scores.items():
-        line = fmt_str.format(name, int(score * 100))
-        if weight != 1.0:
-            line += f" [{weight:.1f}]"
-        lines.append(line)
+    lines = [format_score(weighted_scores, key, score)
+             for key, score in weighted_scores.items()]
     lines.append("-" * len(max(lines, key=len)))
-    lines.append(fmt_str.format(result[0], int(result[1] * 100)))
+    lines.append(format_total(weighted_scores, result))
     return "\n" + "\n".join(lines) + "\n"
 
 
+def format_score(weighted_scores, key: Tuple[str, float], score: float) -> str:
+    """
+    Format one group's line of the score table, aligned with every group in
+    |weighted_scores|.
+    """
+    _, weight = key
+    names = _remove_shared_prefix(weighted_scores)
+    line = _get_fmt_str(names).format(names[key], int(score * 100))
+    if weight != 1.0:
+        line += f" [{weight:.1f}]"
+    return line
+
+
+def format_total(weighted_scores, result: Tuple[str, float]) -> str:
+    fmt_str = _get_fmt_str(_remove_shared_prefix(weighted_scores))
+    return fmt_str.format(result[0], int(result[1] * 100))
+
+
+def _get_fmt_str(names: Dict[Tuple[str, float], str]) -> str:
+    width = len(max(names.values(), key=len)) + 1
+    return "{0:>" + str(width) + "} | {1:>3}%"
+
+
 def _remove_shared_prefix(weighted_scores: Dict[Tuple[str, int], float]
-) -> Dict[Tuple[str, int], float]:
+) -> Dict[Tuple[str, int], str]:
+    """Return a mapping of each group to its name without a shared prefix."""
     prefix = list(weighted_scores)[0][0].split(".", maxsplit=1)[0] + "."
     if all(name.startswith(prefix) for (name, _) in weighted_scores):
-        weighted_scores = {(name.replace(prefix, ""), weight): score
-                           for (name, weight), score in weighted_scores.items()}
-    return weighted_scores
+        return {(name, weight): name.replace(prefix, "")
+                for (name, weight) in weighted_scores}
+    return {(name, weight): name for (name, weight) in weighted_scores}
 
 
-def _get_result(weighted_scores: Dict[Tuple[str, int], float],
-                penalty: float) -> Dict[str, float]:
+def get_result(weighted_scores: Dict[Tuple[str, int], float],
+               penalty: float) -> Dict[str, float]:
     label = "[TOTAL]"
     if penalty:
         label += "[LATE]"
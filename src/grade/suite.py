@@ -1,7 +1,10 @@
+import os
 import random
 import traceback
+import types
 import typing
-from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Tuple,
+                    Union)
 
 from src import error
 from src.grade import case
@@ -10,14 +13,29 @@ from src.sandbox import safepkg
 from src.sandbox import sandbox
 
 
+_compiled: Dict[str, Tuple[float, types.CodeType]] = {}
+
+
 def load_cases(case_path: str, pkg: safepkg.SafePackage) -> List[case.Case]:
     cts = CaseyTestSuite(pkg)
-    with open(case_path, "r") as fp:
-        exec(fp.read(), {"casey": cts, "typing": typing, "error": error,
-                         "Null": safedef.Null})
+    exec(compile_cases(case_path), {"casey": cts, "typing": typing,
+                                    "error": error, "Null": safedef.Null})
     return cts.groups
 
 
+def compile_cases(case_path: str) -> types.CodeType:
+    """
+    Return the compiled code of the cases file, recompiling only if the file
+    was modified since it was last compiled.
+    """
+    mtime = os.path.getmtime(case_path)
+    if case_path not in _compiled or _compiled[case_path][0] != mtime:
+        with open(case_path, "r") as fp:
+            code = compile(fp.read(), "<string>", "exec")
+        _compiled[case_path] = (mtime, code)
+    return _compiled[case_path][1]
+
+
 
 
 class CaseyTestSuite(object):
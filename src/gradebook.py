@@ -0,0 +1,111 @@
+import glob
+import json
+import os
+import sqlite3
+from typing import Dict, Optional, Set
+
+from src import utils
+from src.grade import grade
+
+
+# paths of the databases whose schema this process has created or found
+_created: Set[str] = set()
+
+
+class Gradebook(object):
+    """
+    Index of each user's best scores, kept in an SQLite database alongside
+    the scores.json files so that lookups do not need to open every file.
+    """
+
+    def __init__(self, path: str = "") -> None:
+        self.path: str = path or os.path.join(utils.get_root_dirname(),
+                                              "gradebook.db")
+
+    def update(self, course: str, assignment: str, username: str,
+               scores: Dict[str, float]) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+                         (course, assignment, username, json.dumps(scores),
+                          grade.get_total(scores)))
+
+    def load(self, course: str, assignment: str,
+             username: str) -> Optional[Dict[str, float]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT scores FROM scores WHERE course = ?"
+                               " AND assignment = ? AND username = ?",
+                               (course, assignment, username)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_totals(self, course: str, username: str) -> Dict[str, float]:
+        """Return a mapping of assignment names to the user's total score."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT assignment, total FROM scores"
+                                " WHERE course = ? AND username = ?",
+                                (course, username)).fetchall()
+        return dict(rows)
+
+    def get_course(self, course: str) -> Dict[str, Dict[str, float]]:
+        """Return a mapping of usernames to each assignment's total score."""
+        totals = {}
+        with self._connect() as conn:
+            for assignment, username, total in conn.execute(
+                    "SELECT assignment, username, total FROM scores"
+                    " WHERE course = ?", (course,)):
+                totals.setdefault(username, {})[assignment] = total
+        return totals
+
+    def rebuild(self, course: str) -> int:
+        """
+        Index the scores.json file of every user in the course and return the
+        number of files indexed.
+        """
+        rows = []
+        paths = glob.glob(os.path.join(utils.get_root_dirname(), course, "*",
+                                       "*", "scores.json"))
+        for path in paths:
+            dirname = os.path.dirname(path)
+            assignment = os.path.basename(os.path.dirname(dirname))
+            with open(path, "r") as fp:
+                scores = json.load(fp)
+            rows.append((course, assignment, os.path.basename(dirname),
+                         json.dumps(scores), grade.get_total(scores)))
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO scores"
+                             " VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _connect(self) -> "_Connection":
+        is_new = not os.path.exists(self.path)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if is_new or self.path not in _created:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS scores (course TEXT,"
+                         " assignment TEXT, username TEXT, scores TEXT,"
+                         " total REAL,"
+                         " PRIMARY KEY (course, assignment, username))")
+            conn.execute("CREATE INDEX IF NOT EXISTS scores_by_user"
+                         " ON scores (course, username)")
+            conn.commit()
+            _created.add(self.path)
+        if is_new:
+            os.chmod(self.path, 0o600)
+        return _Connection(conn)
+
+
+
+class _Connection(object):
+    """Commit on success and always close the wrapped connection."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, *args) -> bool:
+        try:
+            if args[0] is None:
+                self.conn.commit()
+        finally:
+            self.conn.close()
@@ -0,0 +1,125 @@
+import bisect
+import contextlib
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+# upper bounds (in seconds) of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, 120.0, 300.0)
+
+_trace: List[Tuple[str, float]] = []
+_fields: Dict[str, Any] = {}
+
+
+@contextlib.contextmanager
+def timer(stage: str) -> Iterator[None]:
+    """Record the time spent in the block as |stage| of the current trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _trace.append((stage, time.perf_counter() - started))
+
+
+def record(stage: str, seconds: float) -> None:
+    """Record |seconds| spent in |stage| elsewhere (e.g. in a child process)."""
+    _trace.append((stage, seconds))
+
+
+def annotate(**fields) -> None:
+    """Record details of the current submission (e.g. whether it was cached)."""
+    _fields.update(fields)
+
+
+def increment(name: str, count: int = 1) -> None:
+    _fields[name] = _fields.get(name, 0) + count
+
+
+def update_max(name: str, value: float) -> None:
+    """Record |value| as the detail |name| if it exceeds the value recorded."""
+    _fields[name] = max(_fields.get(name, value), value)
+
+
+def start_trace() -> None:
+    """Discard the stages and details recorded for the previous submission."""
+    del _trace[:]
+    _fields.clear()
+
+
+def get_durations() -> Dict[str, float]:
+    """
+    Return the seconds spent in each stage since the trace was started.
+    Stages recorded more than once (e.g. Writer I/O) are summed.
+    """
+    durations = {}
+    for stage, seconds in _trace:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    return durations
+
+
+def get_fields() -> Dict[str, Any]:
+    return dict(_fields)
+
+
+class Histogram(object):
+    """A cumulative histogram of observed durations."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative(self) -> Iterator[Tuple[str, int]]:
+        """Yield the upper bound of each bucket and the count up to it."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), total
+
+
+class Registry(object):
+    """
+    Histograms of the time spent in each stage of grading, keyed by course,
+    assignment, and stage.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def observe(self, course: str, assignment: str,
+                durations: Dict[str, float]) -> None:
+        for stage, seconds in durations.items():
+            key = (course, assignment, stage)
+            self.histograms.setdefault(key, Histogram()).observe(seconds)
+
+    def format(self, gauges: Dict[str, float]) -> str:
+        """
+        Return the histograms and |gauges| in the Prometheus text exposition
+        format.
+        """
+        lines = ["# TYPE casey_stage_seconds histogram"]
+        for (course, assignment, stage), hist in sorted(
+                self.histograms.items()):
+            labels = (f'course="{_escape(course)}",'
+                      f'assignment="{_escape(assignment)}",'
+                      f'stage="{_escape(stage)}"')
+            for bound, count in hist.get_cumulative():
+                lines.append(f'casey_stage_seconds_bucket{{{labels},'
+                             f'le="{bound}"}} {count}')
+            lines.append(f"casey_stage_seconds_sum{{{labels}}} {hist.sum:.6f}")
+            lines.append(f"casey_stage_seconds_count{{{labels}}} {hist.count}")
+        for name, value in gauges.items():
+            lines.append(f"# TYPE casey_{name} gauge")
+            lines.append(f"casey_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
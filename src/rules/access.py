@@ -10,13 +10,58 @@ def load_access(config: configparser.ConfigParser, username: str,
     Return a bool indicating whether the submission is providing feedback and
     a float specifying a penalty to apply if the submission is late.
     """
-    entries = _get_entries(config)
-    due_datetime = _get_due_datetime(config, username, entries["due_time"])
-    is_open = _is_open(now, entries["open_before"], entries["close_after"],
-                       entries["late_hours"], entries["grace"], due_datetime)
-    penalty = _get_penalty(entries["late_hours"], entries["penalty"],
-                           due_datetime, now)
-    return (due_datetime, is_open, penalty)
+    return Access(config).load(username, now)
+
+
+class Access(object):
+    """
+    The access rules of an assignment, parsed once so that each submission
+    only looks up the user's due date.
+    """
+
+    def __init__(self, config: configparser.ConfigParser) -> None:
+        self.entries: Dict[str, Union[float, int, str]] = _get_entries(config)
+        self.due_dates: Dict[str, datetime.datetime] = {}
+        self.default_due: Optional[datetime.datetime] = None
+        for section in config.sections():
+            section = section.lower()
+            section_date = _parse_date(section, self.entries["due_time"])
+            if section_date:
+                usernames = config.options(section)
+                for username in usernames:
+                    self.due_dates[username] = section_date
+                if not usernames and not self.default_due:
+                    self.default_due = section_date
+
+    def load(self, username: str, now: datetime.datetime
+    ) -> Tuple[datetime.datetime, bool, float]:
+        """Return the due datetime, whether submission is open, and penalty."""
+        entries = self.entries
+        due_datetime = self.get_due_datetime(username)
+        is_open = _is_open(now, entries["open_before"], entries["close_after"],
+                           entries["late_hours"], entries["grace"],
+                           due_datetime)
+        penalty = _get_penalty(entries["late_hours"], entries["penalty"],
+                               due_datetime, now)
+        return (due_datetime, is_open, penalty)
+
+    def get_due_datetime(self, username: str) -> datetime.datetime:
+        """
+        Return the due datetime for the user.
+
+        Sections marking due datetimes follow one of these formats:
+
+               with time: [YYYY-MM-DD HH:MM]
+            without time: [YYYY-MM-DD]
+
+        If time is not specified for a user, the global submission time is
+        used. A user listed in no section is due on the first section that
+        lists no users.
+        """
+        user_datetime = self.due_dates.get(username, self.default_due)
+        if not user_datetime:
+            raise Exception("No due date specified")
+        return user_datetime
 
 
 def _get_entries(config: configparser.ConfigParser
@@ -62,33 +107,6 @@ def _get_entries(config: configparser.ConfigParser
                 "penalty": float(config.get(section, "penalty", fallback=1.0))}
 
 
-def _get_due_datetime(config: configparser.ConfigParser, username: str,
-                      due_time: datetime.time) -> datetime.datetime:
-    """
-    Read each config section to find the due datetime for the user.
-
-    Sections marking due datetimes follow one of these formats:
-
-           with time: [YYYY-MM-DD HH:MM]
-        without time: [YYYY-MM-DD]
-
-    If time is not specified for a user, the global submission time is used.
-    """
-    user_datetime = None
-    for section in config.sections():
-        section = section.lower()
-        section_date = _parse_date(section, due_time)
-        if section_date:
-            usernames = config.options(section)
-            if username in usernames:
-                user_datetime = section_date
-            elif not user_datetime and not usernames:
-                user_datetime = section_date
-    if not user_datetime:
-        raise Exception("No due date specified")
-    return user_datetime
-
-
 def _parse_date(section: str,
                 due_time: datetime.time) -> Optional[datetime.datetime]:
     try:
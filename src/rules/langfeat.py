@@ -3,12 +3,143 @@ import copy
 import os
 import re
 import sys
-from typing import Dict, Iterable, Tuple
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from src import cache
 
 
 # category -> feature -> object -> range
 FeatRules = Dict[str, Dict[str, Dict[str, Iterable[int]]]]
 
+# types whose methods may be called by name alone (e.g. append for list.append)
+TYPE_NAMES = ("dict", "list", "set", "str", "tuple", "queue.PriorityQueue")
+
+_compiled: Dict[str, "CompiledRules"] = {}
+
+
+class CompiledRules(object):
+    """
+    An immutable form of FeatRules for constant-time permission lookups.
+
+    Calls defined by the submission are layered on with |extend|, which
+    shares the compiled sets and indexes rather than copying them.
+    """
+
+    def __init__(self, feat_rules: FeatRules) -> None:
+        # category -> features
+        self._features: Dict[str, FrozenSet[str]] = {
+            category: frozenset(features)
+            for category, features in feat_rules.items()}
+        # category -> feature -> functions allowed to use it (if restricted)
+        self._overrides: Dict[str, Dict[str, FrozenSet[str]]] = {
+            category: {feature: frozenset(def_names)
+                       for feature, def_names in features.items() if def_names}
+            for category, features in feat_rules.items()}
+        # first part of a dotted call -> calls
+        self._prefixes: Dict[str, Tuple[str, ...]] = {}
+        for feature in sorted(self._features["calls"]):
+            if "." in feature:
+                prefix = feature.split(".", maxsplit=1)[0]
+                self._prefixes[prefix] = self._prefixes.get(prefix, ()) + (
+                    feature,)
+        # method name -> qualified call (e.g. append -> list.append)
+        self._methods: Dict[str, str] = {}
+        for type_name in TYPE_NAMES:
+            for feature in self._features["calls"]:
+                method_name = _get_method_name(type_name, feature)
+                if method_name:
+                    self._methods[method_name] = feature
+        self._extra: FrozenSet[str] = frozenset()
+        # unqualified call -> call qualified by a user module name
+        self._qualified: Dict[str, str] = {}
+        self.mod_names: Tuple[str, ...] = ()
+        self.fingerprint: str = cache.make_key(feat_rules)
+
+    def extend(self, calls: Tuple[str, ...],
+               mod_names: Tuple[str, ...]) -> "CompiledRules":
+        """
+        Return the rules with the user-defined |calls| also allowed, where
+        unqualified calls resolve to the functions of the user modules
+        |mod_names|.
+        """
+        rules = copy.copy(self)
+        extra = set()
+        for feature in calls:
+            if re.match(r"\w+\.__\w+__", feature):
+                if feature.endswith("__init__"):
+                    extra.add(feature.split(".")[0])
+            else:
+                extra.add(feature)
+        rules._extra = frozenset(extra - self._features["calls"]) | self._extra
+        method_names = {_get_method_name(type_name, feature)
+                        for type_name in TYPE_NAMES
+                        for feature in rules._extra} - {None}
+        if method_names:
+            rules._methods = dict(self._methods)
+            for method_name in method_names:
+                for type_name in TYPE_NAMES:
+                    if rules.has("calls", f"{type_name}.{method_name}"):
+                        rules._methods[method_name] = f"{type_name}." + \
+                            method_name
+        rules._qualified = {}
+        for mod_name in mod_names:
+            prefix = mod_name.split(".", maxsplit=1)[0]
+            for feature in (self._prefixes.get(prefix, ())
+                            + tuple(rules._extra)):
+                if feature.startswith(mod_name + "."):
+                    name = feature[len(mod_name) + 1:]
+                    rules._qualified[name] = rules._qualify(name, mod_names)
+        rules.mod_names = mod_names
+        rules.fingerprint = cache.make_key(self.fingerprint,
+                                           sorted(rules._extra), mod_names)
+        return rules
+
+    def get_features(self, category: str) -> Tuple[str, ...]:
+        if category == "calls":
+            return tuple(self._features[category]) + tuple(self._extra)
+        return tuple(self._features[category])
+
+    def has(self, category: str, feature: str) -> bool:
+        return (feature in self._features[category]
+                or category == "calls" and feature in self._extra)
+
+    def is_allowed(self, category: str, feature: str, def_name: str) -> bool:
+        """
+        Return True if the function |def_name| may use |feature| and False
+        otherwise. Calls of methods and of functions in the user modules may
+        be unqualified (e.g. append for list.append).
+        """
+        if category == "calls" and not self.has(category, feature):
+            if feature.startswith("."):  # TODO: remove
+                return True
+            feature = self._qualified.get(feature, feature)
+            feature = self._methods.get(feature.rsplit(".", maxsplit=1)[-1],
+                                        feature)
+        if not self.has(category, feature):
+            return False
+        def_names = self._overrides[category].get(feature)
+        return not def_names or def_name in def_names
+
+    def _qualify(self, feature: str, mod_names: Tuple[str, ...]) -> str:
+        for mod_name in mod_names:
+            if self.has("calls", f"{mod_name}.{feature}"):
+                feature = f"{mod_name}." + feature
+        return feature
+
+
+def compile_features(config: configparser.ConfigParser,
+                     paths: Tuple[str, ...]) -> CompiledRules:
+    """
+    Return the compiled rules of |config|, reusing those already compiled for
+    the same rules and user modules.
+    """
+    sections = {section: dict(config.items(section, raw=True))
+                for section in config.sections()}
+    key = cache.make_key(sections, _get_user_modules(paths))
+    if key not in _compiled:
+        _compiled[key] = CompiledRules(load_features(config, paths))
+    return _compiled[key]
+
 
 def load_features(config: configparser.ConfigParser,
                   paths: Tuple[str, ...]) -> FeatRules:
@@ -115,6 +246,15 @@ def _get_range(config: configparser.ConfigParser, category: str,
         raise ValueError("Invalid range")
 
 
+def _get_method_name(type_name: str, feature: str) -> Optional[str]:
+    """Return the method name if |feature| is a method of |type_name|."""
+    if feature.startswith(type_name + "."):
+        method_name = feature[len(type_name) + 1:]
+        if "." not in method_name:
+            return method_name
+    return None
+
+
 def _get_user_modules(paths: Tuple[str, ...]) -> Tuple[str, ...]:
     return tuple(os.path.splitext(os.path.basename(path))[0] for path in paths)
 
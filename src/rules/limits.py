@@ -0,0 +1,45 @@
+import configparser
+from typing import Dict
+
+
+class Limits(object):
+    """The resource limits of an assignment's submissions."""
+
+    def __init__(self, config: configparser.ConfigParser) -> None:
+        entries = _get_entries(config)
+        self.memory: int = entries["memory"] * 2**20
+        self.case_time: int = entries["case_time"]
+        self.group_time: int = entries["group_time"]
+        self.submission_time: int = entries["submission_time"]
+
+
+def _get_entries(config: configparser.ConfigParser) -> Dict[str, int]:
+    """
+    Return a dictionary of resource limits, listed below. If any limits are
+    not found in the config files, default values (shown in brackets) are
+    used.
+
+    memory: int [512]
+        The number of megabytes each case may allocate beyond the memory in
+        use when it starts. 0 means cases may allocate without limit.
+
+    case_time: int [10]
+        The number of seconds of wall-clock time each case may run, or its
+        CPU time limit if more.
+
+    group_time: int [120]
+        The number of seconds of wall-clock time each group of cases may
+        run.
+
+    submission_time: int [300]
+        The number of seconds of wall-clock time the submission's modules
+        may load and its cases run.
+
+    The time limits stop submissions that wait rather than compute (e.g. by
+    sleeping), which the CPU time limits of the cases do not. 0 means no
+    limit.
+    """
+    defaults = {"memory": 512, "case_time": 10, "group_time": 120,
+                "submission_time": 300}
+    return {option: int(config.get("limits", option, fallback=default))
+            for option, default in defaults.items()}
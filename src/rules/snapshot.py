@@ -0,0 +1,110 @@
+import configparser
+import os
+import time
+from typing import Dict, List, Tuple
+
+from src import utils
+from src.rules import access
+from src.rules import langfeat
+from src.rules import limits
+from src.rules import rules
+
+
+# the tool configs resolved for each assignment
+CFG_NAMES = ("pylint.cfg", "mypy.cfg")
+
+# seconds between checks of whether the config files have changed
+CHECK_INTERVAL = 1.0
+
+_snapshots: Dict[Tuple[str, str], "Snapshot"] = {}
+_checked: Dict[Tuple[str, str], float] = {}
+
+
+class Snapshot(object):
+    """
+    The parsed rules of an assignment as of the modification times of its
+    config files. Snapshots are shared by every submission to the assignment
+    and must not be modified; editing a config file replaces the snapshot.
+    """
+
+    def __init__(self, course: str, assignment: str) -> None:
+        self.course: str = course
+        self.assignment: str = assignment
+        # read before parsing so that an edit made while parsing is detected
+        self.mtimes: Dict[str, int] = _get_mtimes(course, assignment)
+        self.config: configparser.ConfigParser = rules.load_config(course,
+                                                                   assignment)
+        self.filenames: Tuple[str, ...] = tuple(
+            utils.get_filenames(course, assignment))
+        self.access: access.Access = access.Access(self.config)
+        self.limits: limits.Limits = limits.Limits(self.config)
+        self.cfg_paths: Dict[str, str] = {}
+        for filename in CFG_NAMES:
+            try:
+                self.cfg_paths[filename] = utils.get_cfg_path(
+                    course, assignment, filename)
+            except FileNotFoundError:
+                pass
+        self.features: langfeat.CompiledRules = langfeat.compile_features(
+            self.config, self.filenames)
+
+    def is_stale(self) -> bool:
+        return _get_mtimes(self.course, self.assignment) != self.mtimes
+
+    def get_cfg_path(self, filename: str) -> str:
+        """Return the path of the tool config like |utils.get_cfg_path|."""
+        if filename not in self.cfg_paths:
+            raise FileNotFoundError
+        return self.cfg_paths[filename]
+
+    def get_features(self, paths: Tuple[str, ...]) -> langfeat.CompiledRules:
+        """Return the compiled rules for the user modules at |paths|."""
+        if ({utils.get_basename(path) for path in paths}
+                == {utils.get_basename(path) for path in self.filenames}):
+            return self.features
+        return langfeat.compile_features(self.config, paths)
+
+
+def load(course: str, assignment: str) -> Snapshot:
+    """
+    Return the current snapshot of the assignment's rules, parsing the config
+    files again only if any of them changed since the last snapshot. Changes
+    are checked for at most once every |CHECK_INTERVAL| seconds.
+    """
+    key = (course, assignment)
+    now = time.monotonic()
+    snapshot = _snapshots.get(key)
+    if snapshot is None or now - _checked[key] >= CHECK_INTERVAL:
+        if snapshot is None or snapshot.is_stale():
+            _snapshots[key] = Snapshot(course, assignment)
+        _checked[key] = now
+    return _snapshots[key]
+
+
+def get_filenames(course: str, assignment: str) -> List[str]:
+    """Return the names of the files submitted for the assignment."""
+    try:
+        return list(load(course, assignment).filenames)
+    except (FileNotFoundError, configparser.Error):
+        return utils.get_filenames(course, assignment)
+
+
+def _get_mtimes(course: str, assignment: str) -> Dict[str, int]:
+    """
+    Return the modification time of each config file and of the directories
+    that contain them, where adding or removing a file (e.g. an assignment's
+    own pylint.cfg) changes the modification time of its directory.
+    """
+    dirnames = [os.path.join(utils.get_top_dirname(), "cases"),
+                os.path.join(utils.get_top_dirname(), "cases", course),
+                utils.get_assignment_dirname(course, assignment)]
+    paths = [os.path.join(dirnames[0], "defaults.cfg"),
+             os.path.join(dirnames[1], "defaults.cfg"),
+             os.path.join(dirnames[2], "rules.cfg")]
+    mtimes = {}
+    for path in dirnames + paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = -1
+    return mtimes
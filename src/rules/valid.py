@@ -1,8 +1,14 @@
 import ast
+import multiprocessing.connection
+import os
 import re
-from typing import Dict, List, Set, Tuple
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
+from src import cache
 from src import error
+from src import metrics
 from src.rules import langfeat
 from src.sandbox import safemod
 from src.static import analysis
@@ -10,28 +16,109 @@ from src.static import defparse
 from src.static import modparse
 
 
+# incremented when the validation of functions changes
+FUNCTION_VERSION = 1
+
+Check = Callable[[error.ErrorFormatter, str, str, Tuple[str, ...]], None]
+
+
 def validate_package(course: str, assignment: str, files: Dict[str, str],
-                     feat_rules: langfeat.FeatRules,
+                     feat_rules: langfeat.CompiledRules,
                      safemods: List[safemod.SafeModule],
-                     skip_lint: bool, skip_type: bool) -> error.ErrorFormatter:
+                     skip_lint: bool, skip_type: bool,
+                     functions: Optional[cache.FunctionCache] = None
+) -> error.ErrorFormatter:
     """
     Run linting (with pylint) and type checking (with mypy) on the package
     and return the aggregated errors.
+
+    mypy runs in a forked child while pylint and the feature validation run
+    in this process, which keeps pylint's linter and astroid's cache warm for
+    the next package it validates. Their errors are merged in the order
+    pylint, mypy, features regardless of which finishes first.
+
+    If given, |functions| caches the errors of each function so that only new
+    or changed functions are validated.
     """
     errors = error.ErrorFormatter(files)
     mod_names = tuple(sm.name for sm in safemods)
-    if not skip_lint:
-        analysis.check_style(errors, course, assignment, tuple(files))
+    children = []
     if not skip_type:
-        analysis.check_types(errors, course, assignment, tuple(files))
-    for sm in safemods:
-        _validate_module(errors, sm, feat_rules, mod_names)
+        children.append(_start("mypy", analysis.check_types, course,
+                               assignment, files))
+    features = error.ErrorFormatter(files)
+    try:
+        if not skip_lint:
+            with metrics.timer("pylint"):
+                analysis.check_style(errors, course, assignment, tuple(files))
+        with metrics.timer("features"):
+            if feat_rules.mod_names != mod_names:
+                feat_rules = feat_rules.extend((), mod_names)
+            rules_key = cache.make_key(FUNCTION_VERSION,
+                                       feat_rules.fingerprint)
+            for sm in safemods:
+                _validate_module(features, sm, feat_rules, functions,
+                                 rules_key)
+            if functions is not None:
+                functions.save()
+    finally:
+        joined = [_join(pid, reader) for pid, reader in children]
+    for found, exc in joined:
+        if exc:
+            raise error.CaseyRuntimeError(exc)
+        errors.merge(found)
+    errors.merge(features)
     return errors
 
 
+def _start(stage: str, check: Check, course: str, assignment: str,
+           files: Dict[str, str]
+) -> Tuple[int, multiprocessing.connection.Connection]:
+    """
+    Run |check| on the files in a forked child, which sends back the time it
+    took and the errors found (or the traceback of the exception raised).
+    """
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reader.close()
+            found = error.ErrorFormatter(files)
+            started = time.perf_counter()
+            try:
+                check(found, course, assignment, tuple(files))
+            except BaseException:
+                writer.send((stage, time.perf_counter() - started, None,
+                             traceback.format_exc()))
+            else:
+                writer.send((stage, time.perf_counter() - started, found, ""))
+        finally:
+            os._exit(0)
+    writer.close()
+    return pid, reader
+
+
+def _join(pid: int, reader: multiprocessing.connection.Connection
+) -> Tuple[Optional[error.ErrorFormatter], str]:
+    """
+    Wait for the child and return the errors it found, or the traceback of
+    the exception raised by its check (or a message if it sent no result).
+    """
+    try:
+        stage, seconds, found, exc = reader.recv()
+    except EOFError:
+        return None, f"Validation process {pid} exited without a result"
+    finally:
+        reader.close()
+        os.waitpid(pid, 0)
+    metrics.record(stage, seconds)
+    return found, exc
+
+
 def _validate_module(errors: error.ErrorFormatter, sm: safemod.SafeModule,
-                     feat_rules: langfeat.FeatRules,
-                     mod_names: Tuple[str, ...]) -> None:
+                     feat_rules: langfeat.CompiledRules,
+                     functions: Optional[cache.FunctionCache] = None,
+                     rules_key: str = "") -> None:
     """
     Return any module-level errors, defined as the following:
         - Invalid header
@@ -47,11 +134,39 @@ def _validate_module(errors: error.ErrorFormatter, sm: safemod.SafeModule,
     if not sm.is_suite and globals_found:
         errors.add(sm.name, "Global(s)", hidden=False, linenos=globals_found)
     for def_name, node in sm.nodes.items():
-        for message, linenos in _validate_function(def_name, node, feat_rules,
-                                                   mod_names).items():
+        if functions is None:
+            found = _validate_function(def_name, node, feat_rules)
+        else:
+            found = _validate_cached(functions, rules_key, sm.lines, def_name,
+                                     node, feat_rules)
+        for message, linenos in found.items():
             errors.add(def_name, message, hidden=False, linenos=linenos)
 
 
+def _validate_cached(functions: cache.FunctionCache, rules_key: str,
+                     lines: List[str], name: str, root: ast.FunctionDef,
+                     feat_rules: langfeat.CompiledRules
+) -> Dict[str, Set[int]]:
+    """
+    Return the errors of the function from |functions| if its source and the
+    rules are unchanged, and validate it otherwise. Line numbers are cached
+    relative to the start of the function so that the entry is still valid
+    if the function moves.
+    """
+    start = min([root.lineno] + [node.lineno for node in root.decorator_list])
+    key = cache.make_key(rules_key, name,
+                         "".join(lines[start - 1:root.end_lineno]))
+    cached = functions.get(key)
+    if cached is not None:
+        metrics.increment("cached_functions")
+        return {message: {start + offset for offset in offsets}
+                for message, offsets in cached}
+    found = _validate_function(name, root, feat_rules)
+    functions.put(key, [[message, sorted(lineno - start for lineno in linenos)]
+                        for message, linenos in found.items()])
+    return found
+
+
 def _validate_header(source: str, lines: List[str]) -> Tuple[str, Set[int]]:
     """
     Determine whether the header at the top of the module matches the
@@ -82,7 +197,7 @@ def _validate_header(source: str, lines: List[str]) -> Tuple[str, Set[int]]:
 
 # TODO: allow Any in rules.cfg
 def _validate_imports(sm: safemod.SafeModule,
-                      feat_rules: langfeat.FeatRules) -> Dict[str, Set[int]]:
+                      feat_rules: langfeat.CompiledRules) -> Dict[str, Set[int]]:
     """
     Ensure that all module imports are permitted by the course or
     assignment rules.
@@ -95,23 +210,19 @@ def _validate_imports(sm: safemod.SafeModule,
 #                if annotation not in annotations:
 #                    msg = "Prohibited annotation(s)"
 #                    errors.setdefault(msg, set()).extend(linenos)
-        if name not in tuple(feat_rules["imports"]):
+        if not feat_rules.has("imports", name):
             errors.setdefault("Prohibited import(s)", set()).update(linenos)
     return errors
 
 
 def _validate_function(name: str, root: ast.FunctionDef,
-                       feat_rules: langfeat.FeatRules,
-                       mod_names: Tuple[str, ...]) -> Dict[str, Set[int]]:
+                       feat_rules: langfeat.CompiledRules
+) -> Dict[str, Set[int]]:
     errors = {}
-    parsed = {"calls": defparse.parse_calls(root),
-              "exceptions": defparse.parse_exceptions(root),
-              "keywords": defparse.parse_keywords(root),
-              "operators": defparse.parse_operators(root),
-              "types": defparse.parse_types(root)}
+    parsed = defparse.parse_features(root)
     for category in parsed:
         for feature, linenos in parsed[category].items():
-            if not _is_allowed(category, feature, name, feat_rules, mod_names):
+            if not feat_rules.is_allowed(category, feature, name):
                 message = _label(category, feature, "prohibited")
                 errors[message] = linenos
 #        for feature, functions in feat_rules[category].items():
@@ -132,28 +243,6 @@ def _validate_function(name: str, root: ast.FunctionDef,
     return errors
 
 
-def _is_allowed(category: str, feature: str, def_name: str,
-                feat_rules: langfeat.FeatRules,
-                mod_names: Tuple[str, ...]) -> bool:
-    if category == "calls" and feature not in feat_rules[category]:
-
-        if feature.startswith("."):  # TODO: remove
-            return True
-
-        for mod_name in mod_names:
-            if f"{mod_name}.{feature}" in feat_rules[category]:
-                feature = f"{mod_name}." + feature
-        type_names = ("dict", "list", "set", "str", "tuple",
-                      "queue.PriorityQueue")
-        for type_name in type_names:
-            method_name = feature.rsplit(".", maxsplit=1)[-1]
-            if f"{type_name}.{method_name}" in feat_rules[category]:
-                feature = f"{type_name}." + method_name
-    return (feature in feat_rules[category]
-            and (len(feat_rules[category][feature]) == 0
-                 or def_name in feat_rules[category][feature]))
-
-
 def _label(category: str, feature: str, message: str) -> str:
     return f"[{category.rstrip('s')}:{feature}] {message}"
 
@@ -164,10 +253,10 @@ def _validate_exceptions(root: ast.FunctionDef) -> Dict[str, Set[int]]:
             for exc_name, linenos in exceptions.items()}
 
 
-def _validate_recursion(def_name: str, feat_rules: langfeat.FeatRules,
+def _validate_recursion(def_name: str, feat_rules: langfeat.CompiledRules,
                         parsed_calls: Dict[str, Set[int]]
 ) -> Dict[str, Set[int]]:
-    if "recursion" not in feat_rules["paradigm"]:
+    if not feat_rules.has("paradigm", "recursion"):
         if def_name in parsed_calls:
             message = _label("recursion", def_name, "prohibited")
             return {message: parsed_calls[def_name]}
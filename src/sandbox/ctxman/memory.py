@@ -1,17 +1,101 @@
-import contextlib
+import os
 import resource
+from typing import Optional, Tuple
 
 
-class MemoryManager(object):
+PAGE_SIZE = resource.getpagesize()
 
-    @contextlib.contextmanager
-    def limit(limit, type=resource.RLIMIT_AS):
-        soft_limit, hard_limit = resource.getrlimit(type)
-        resource.setrlimit(type, (limit, hard_limit)) # set soft limit
-        try:
-            yield
-        finally:
-            resource.setrlimit(type, (soft_limit, hard_limit)) # restore
+# the peak resident memory (in kilobytes) of this process before its peak was
+# last reset to measure a block
+_peak_kb: int = 0
 
-    with limit(1 << 30): # 1GB 
-        # do the thing that might try to consume all memory
+
+class MemoryLimit(object):
+    """
+    Raise MemoryError once the block allocates more than |limit| bytes beyond
+    the memory in use when it was entered, by lowering the soft limit on the
+    address space of the process (RLIMIT_AS) for the block, and measure the
+    peak resident memory of the block by resetting the peak of the process
+    (see clear_refs in proc(5)) as it is entered. Both require Linux.
+    """
+
+    def __init__(self, limit: int = 0) -> None:
+        self.limit: int = limit
+        # bytes of resident memory used by the block beyond that at entry
+        self.peak: int = 0
+        self._rlimit: Optional[Tuple[int, int]] = None
+        self._start_kb: int = 0
+        self._pid: int = 0
+        self._statm: int = -1
+        self._clear_refs: int = -1
+
+    def __enter__(self) -> "MemoryLimit":
+        global _peak_kb
+        if self._pid != os.getpid():
+            self._open()
+        if self.limit and self._statm >= 0:
+            self._set_rlimit()
+        self.peak = 0
+        if self._clear_refs >= 0:
+            _peak_kb = max(_peak_kb, _get_maxrss())
+            try:
+                os.write(self._clear_refs, b"5")
+            except OSError:
+                os.close(self._clear_refs)
+                self._clear_refs = -1
+        self._start_kb = _get_maxrss()
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self._rlimit:
+            resource.setrlimit(resource.RLIMIT_AS, self._rlimit)
+            self._rlimit = None
+        if self._clear_refs >= 0:
+            self.peak = max(0, _get_maxrss() - self._start_kb) * 1024
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+
+    def get_message(self) -> str:
+        return f"Process exceeded {self.limit // 2**20} MB"
+
+    def _set_rlimit(self) -> None:
+        size = int(os.pread(self._statm, 64, 0).split()[0]) * PAGE_SIZE
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = size + self.limit
+        for bound in (soft, hard):
+            if bound != resource.RLIM_INFINITY:
+                limit = min(limit, bound)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        self._rlimit = (soft, hard)
+
+    def _open(self) -> None:
+        """
+        Open the files of the current process, which differ from those opened
+        before it was forked.
+        """
+        for fd in (self._statm, self._clear_refs):
+            if fd >= 0:
+                os.close(fd)
+        self._pid = os.getpid()
+        self._statm = _open_proc("statm", os.O_RDONLY)
+        self._clear_refs = _open_proc("clear_refs", os.O_WRONLY)
+
+
+def get_max_rss() -> int:
+    """
+    Return the peak resident memory (in kilobytes) of this process, including
+    the peaks before it was reset by MemoryLimit.
+    """
+    return max(_peak_kb, _get_maxrss())
+
+
+def _get_maxrss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _open_proc(name: str, flags: int) -> int:
+    try:
+        return os.open(f"/proc/{os.getpid()}/{name}", flags)
+    except OSError:
+        return -1
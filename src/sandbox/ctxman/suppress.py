@@ -35,26 +35,48 @@ class Suppressor(object):
             sys.stdin = refin
 
     def __enter__(self):
-        builtins.input = self._promptless_input
-        sys.stdout = io.StringIO()
-        if self.referr:
-            sys.stderr = io.StringIO()
+        self.buffers = (io.StringIO(), io.StringIO() if self.referr else None)
+        self.reset()
         return self
 
     def __exit__(self, *args) -> bool:
+        self.flush()
         builtins.input = self.input
-        self.stdout = sys.stdout.getvalue()
-        sys.stdout.close()
         sys.stdout = self.refout
         if self.referr:
-            self.stderr = sys.stderr.getvalue()
-            sys.stderr.close()
             sys.stderr = self.referr
+        for buffer in self.buffers:
+            if buffer:
+                buffer.close()
+        return True
+
+    def reset(self) -> None:
+        """Discard any output captured so far and capture the output anew."""
+        builtins.input = self._promptless_input
+        self._clear()
+        sys.stdout = self.buffers[0]
+        if self.referr:
+            sys.stderr = self.buffers[1]
+
+    def flush(self) -> None:
+        """
+        Save the output captured since the last reset or flush as
+        |self.stdout| (and |self.stderr|) and echo it to the original stdout.
+        """
+        self.stdout = self.buffers[0].getvalue()
+        if self.referr:
+            self.stderr = self.buffers[1].getvalue()
+        self._clear()
         if self.stdout.strip():
-            print(self.stdout)
+            print(self.stdout, file=self.refout)
         if self.stderr.strip():
-            print(self.stderr)
-        return True
+            print(self.stderr, file=self.refout)
+
+    def _clear(self) -> None:
+        for buffer in self.buffers:
+            if buffer:
+                buffer.seek(0)
+                buffer.truncate()
 
     def print_to_stderr(self) -> None:
         print(type(sys.stdout), file=sys.stderr, flush=True)
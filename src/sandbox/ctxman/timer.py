@@ -1,38 +1,131 @@
-import cProfile
 import os
-import pstats
 import re
 import signal
 import textwrap
-from typing import Any, Callable
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from src import error
 from src import utils
 from src.sandbox.ctxman import disable
 
 
+# seconds of CPU time between samples of the running function
+INTERVAL = 0.01
+
+# the innermost Timer entered, which handles the signals
+_active: Optional["Timer"] = None
+
+
 class Timer(object):
+    """
+    Raise CaseyTimeoutError once the block has used its CPU time. The stack
+    is sampled every |INTERVAL| seconds of CPU time (on SIGPROF) so that the
+    error can report where the time went without slowing down every call as
+    a deterministic profiler would.
+
+    Blocks that wait rather than compute (e.g. by sleeping) are stopped the
+    same way by a wall-clock timer (on SIGALRM) once they have run for
+    |wall_seconds| (if more than their CPU time) or once any deadline set by
+    |set_deadline| has passed, whichever is first.
+
+    A Timer entered within another suspends the timers of the other, which
+    resume with the time that remained less the time spent in the inner one.
+    """
 
-    def __init__(self, dirname: str, seconds: int = 1) -> None:
+    def __init__(self, dirname: str, seconds: int = 1,
+                 wall_seconds: int = 0) -> None:
         self.seconds: int = seconds
+        self.wall_seconds: int = wall_seconds
         self.has_expired: bool = False
-        self.profiler: cProfile.Profile = cProfile.Profile()
+        # code -> [calls, samples, id of the frame last sampled]
+        self.samples: Dict[types.CodeType, List[int]] = {}
+        # what must finish (e.g. "Submission") -> (time.monotonic(), seconds)
+        self.deadlines: Dict[str, Tuple[float, int]] = {}
         self.dirname = dirname
-        signal.signal(signal.SIGVTALRM, self._handle_signal)
+        self._wall_message: str = ""
+        self._outer: Optional[Timer] = None
+        # monotonic and CPU time of entry, and CPU and wall-clock time left
+        # to the outer Timer
+        self._suspended: Tuple[float, float, float, float] = (0, 0, 0, 0)
+        signal.signal(signal.SIGVTALRM, _handle_signal)
+        signal.signal(signal.SIGALRM, _handle_alarm)
+        signal.signal(signal.SIGPROF, _sample)
 
     def __enter__(self) -> "Timer":
-        self.profiler.enable()
+        global _active
+        self._outer, _active = _active, self
+        self.samples.clear()
+        if self._outer:
+            self._suspended = (time.monotonic(), time.process_time(),
+                               signal.getitimer(signal.ITIMER_VIRTUAL)[0],
+                               signal.getitimer(signal.ITIMER_REAL)[0])
         self._set_timer(self.seconds)
+        self._set_wall_timer()
+        signal.setitimer(signal.ITIMER_PROF, INTERVAL, INTERVAL)
         return self
 
     def __exit__(self, *args) -> None:
+        global _active
         self._reset_timer()
-        self.profiler.disable()
-        self.profiler.clear()
+        if self._wall_message:
+            signal.setitimer(signal.ITIMER_REAL, 0.0)
+            self._wall_message = ""
+        signal.setitimer(signal.ITIMER_PROF, 0.0)
+        _active, self._outer = self._outer, None
+        if _active:
+            self._resume_outer()
+
+    def _resume_outer(self) -> None:
+        started, cpu_started, cpu_left, wall_left = self._suspended
+        if cpu_left:
+            cpu_left -= time.process_time() - cpu_started
+            signal.setitimer(signal.ITIMER_VIRTUAL, max(cpu_left, INTERVAL))
+        if wall_left:
+            wall_left -= time.monotonic() - started
+            signal.setitimer(signal.ITIMER_REAL, max(wall_left, INTERVAL))
+        signal.setitimer(signal.ITIMER_PROF, INTERVAL, INTERVAL)
 
     def set_timeout(self, seconds: int) -> None:
         self.seconds = seconds
 
+    def set_deadline(self, name: str, seconds: int) -> None:
+        """
+        Stop any block still running |seconds| of wall-clock time from now,
+        reporting that |name| exceeded them. 0 seconds removes the deadline.
+        """
+        if seconds:
+            self.deadlines[name] = (time.monotonic() + seconds, seconds)
+        else:
+            self.deadlines.pop(name, None)
+
+    def get_deadline(self) -> float:
+        """Return the time.monotonic() of the nearest deadline, or 0 if none."""
+        return min((deadline for deadline, _ in self.deadlines.values()),
+                   default=0.0)
+
+    def _set_wall_timer(self) -> None:
+        """
+        Arm the wall-clock timer for the nearest of the block's own limit and
+        the deadlines. A block entered after a deadline has passed is still
+        given |INTERVAL| seconds, so that only the cases that wait are
+        stopped.
+        """
+        remaining = 0.0
+        if self.wall_seconds:
+            remaining = max(self.wall_seconds, self.seconds)
+            self._wall_message = (f"Process exceeded {remaining} second(s) "
+                                  "of wall-clock time")
+        now = time.monotonic()
+        for name, (deadline, seconds) in self.deadlines.items():
+            if not remaining or deadline - now < remaining:
+                remaining = max(deadline - now, INTERVAL)
+                self._wall_message = (f"{name} exceeded {seconds} second(s) "
+                                      "of wall-clock time")
+        if remaining:
+            signal.setitimer(signal.ITIMER_REAL, remaining)
+
     def _set_timer(self, seconds: int):
         self.has_expired = False
         signal.setitimer(signal.ITIMER_VIRTUAL, seconds)
@@ -40,29 +133,51 @@ class Timer(object):
     def _reset_timer(self):
         self._set_timer(0.0)
 
+    def _sample(self, signum: int, frame: types.FrameType) -> None:
+        """
+        Count a sample of the running function, and a call of it if the
+        sampled frame differs from the one sampled last.
+        """
+        if self.has_expired:
+            return
+        entry = self.samples.setdefault(frame.f_code, [0, 0, 0])
+        if entry[2] != id(frame):
+            entry[0] += 1
+            entry[2] = id(frame)
+        entry[1] += 1
+
 #    @disable.suspend
     def _handle_signal(self, *args):
-        self.profiler.disable()
+        self._expire(f"Process exceeded {self.seconds} second(s)")
+
+    def _handle_alarm(self, *args):
+        self._expire(self._wall_message)
+
+    def _expire(self, msg: str) -> None:
+        for which in (signal.ITIMER_PROF, signal.ITIMER_VIRTUAL,
+                      signal.ITIMER_REAL):
+            signal.setitimer(which, 0.0)
         self.has_expired = True
         stats = self._gather_stats()
-        msg = f"Process exceeded {self.seconds} second(s)"
         if stats:
             msg += "\n\n" + stats
         raise error.CaseyTimeoutError(msg)
 
     def _gather_stats(self) -> str:
+        """
+        Return the table of the sampled functions, where the seconds of each
+        include any built-ins it called and its calls are those sampled.
+        """
         selected = {}
-        with open(os.devnull) as devnull:
-            stats = pstats.Stats(self.profiler, stream=devnull).stats
-            for (path, _, name), (_, ncalls, tottime, _, _) in stats.items():
-                tottime = round(tottime, 2)
-                if tottime > 0:
-                    name = self._qualify_name(path, name)
-                    if name == "[casey overhead]":
-                        selected.setdefault(name, (0, 0))
-                        selected[name] = (0, selected[name][1] + tottime)
-                    else:
-                        selected[name] = (ncalls, tottime)
+        for code, (ncalls, nsamples, _) in self.samples.items():
+            tottime = round(nsamples * INTERVAL, 2)
+            if tottime > 0:
+                name = self._qualify_name(code.co_filename, code.co_name)
+                if name == "[casey overhead]":
+                    selected.setdefault(name, (0, 0))
+                    selected[name] = (0, selected[name][1] + tottime)
+                else:
+                    selected[name] = (ncalls, tottime)
         return self._format_stats(selected)
 
     def _qualify_name(self, path: str, name: str) -> str:
@@ -70,14 +185,6 @@ class Timer(object):
             return name
         if path.strip("/").startswith(utils.get_top_dirname().strip("/")):
             return "[casey overhead]"
-        match = re.match(r"<built-in method (\w+)\.(\w+)>", name)
-        if match:
-            if match.group(1) == "builtins":
-                return match.group(2)
-            return match.group(2) + "." + match.group(1)
-        match = re.match(r"<method '(\w+)' of '([\w.]+)' objects>", name)
-        if match:
-            return match.group(2) + "." + match.group(1)
         match = re.match(r"/usr/lib64/python\d+\.\d+/(\w+).py", path)
         if match:
             return match.group(1) + "." + name
@@ -95,3 +202,21 @@ class Timer(object):
             ncalls, tottime = stats[name]
             output += fmt_str.format(name, ncalls, tottime, ".2f")
         return textwrap.indent(output, " " * 2)
+
+
+def _handle_signal(*args) -> None:
+    if _active:
+        _active._handle_signal(*args)
+
+
+def _handle_alarm(*args) -> None:
+    timer = _active
+    while timer and not timer._wall_message:
+        timer = timer._outer
+    if timer:
+        timer._handle_alarm(*args)
+
+
+def _sample(signum: int, frame: types.FrameType) -> None:
+    if _active:
+        _active._sample(signum, frame)
@@ -9,10 +9,11 @@ from src.sandbox import sandbox
 class SafeFunctionResult(object):
 
     def __init__(self, retval: Any, stdout: str,
-                 exc_info: error.ExcInfo) -> None:
+                 exc_info: error.ExcInfo, peak_memory: int = 0) -> None:
         self.retval = retval
         self.stdout = stdout
         self.exc_info = exc_info
+        self.peak_memory = peak_memory
 
     def __repr__(self) -> str:
         return (self.__class__.__name__ +
@@ -71,11 +72,15 @@ class SafeFunction(object):
             try:
                 retval = self.function(*args, **kwargs)
                 exc_info = (None, None, None)
+            except MemoryError:
+                retval = Null()
+                exc_info = sb.relabel_memory_error(sys.exc_info())
             except:
                 retval = Null()
                 exc_info = sys.exc_info()
         stdout = sb.get_stdout()
-        return SafeFunctionResult(retval, stdout, exc_info)
+        return SafeFunctionResult(retval, stdout, exc_info,
+                                  sb.get_peak_memory())
 
     def disable_function(self):
         self.function = SafeFunction.disable()
@@ -1,5 +1,8 @@
 import ast
 import importlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
 import inspect
 import os
 import re
@@ -87,13 +90,14 @@ class SafeModule(object):
 
     # TODO: use sandbox
     def _import_module(self, sb: sandbox.Sandbox) -> types.ModuleType:
-        module_name = inspect.getmodulename(self.path)
-        sys.modules.pop(module_name, None)
-        sys.path.insert(0, os.path.dirname(self.path))
-#        with sb:
-        module = importlib.import_module(module_name)
+        _finder.safemods[self.name] = self
+        if _finder not in sys.meta_path:
+            sys.meta_path.insert(0, _finder)
+        sys.modules.pop(self.name, None)
+        with sb.get_timer():
+            module = importlib.import_module(self.name)
 #        globals()[module_name] = module
-        sys.modules[module_name] = module
+        sys.modules[self.name] = module
         return module
 
     def _wrap_functions(self, module: types.ModuleType,
@@ -133,3 +137,59 @@ class SafeModule(object):
             elif isinstance(node, ast.ClassDef):
                 nodes.update(self._get_nodes(node, cls_name=node.name))
         return nodes
+
+
+class ModuleLoader(importlib.abc.Loader):
+    """
+    Load a submitted module by compiling the AST already parsed by its
+    SafeModule, rather than reading and parsing the file again.
+    """
+
+    def __init__(self, sm: SafeModule) -> None:
+        self.sm: SafeModule = sm
+
+    def create_module(self, spec: importlib.machinery.ModuleSpec) -> None:
+        return None  # use the default module creation
+
+    def exec_module(self, module: types.ModuleType) -> None:
+        exec(compile(self.sm.root, self.sm.path, "exec"), module.__dict__)
+
+    def get_source(self, fullname: str) -> str:
+        return self.sm.source
+
+
+class PackageFinder(importlib.abc.MetaPathFinder):
+    """
+    Find the modules of the current submission in memory, so that they and
+    their imports of each other never touch the disk or |sys.path|.
+    """
+
+    def __init__(self) -> None:
+        self.safemods: Dict[str, SafeModule] = {}
+
+    def find_spec(self, fullname: str, path: Optional[List[str]] = None,
+                  target: Optional[types.ModuleType] = None
+    ) -> Optional[importlib.machinery.ModuleSpec]:
+        sm = self.safemods.get(fullname)
+        if sm is None or path is not None:
+            return None
+        return importlib.util.spec_from_file_location(
+            fullname, sm.path, loader=ModuleLoader(sm))
+
+
+_finder = PackageFinder()
+
+
+def install(safemods: List[SafeModule]) -> None:
+    """
+    Serve the modules of |safemods| from memory on import, replacing the
+    modules of any previous submission.
+    """
+    for name in set(_finder.safemods) | {sm.name for sm in safemods}:
+        module = sys.modules.get(name)
+        spec = getattr(module, "__spec__", None)
+        if isinstance(getattr(spec, "loader", None), ModuleLoader):
+            del sys.modules[name]
+    _finder.safemods = {sm.name: sm for sm in safemods}
+    if _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
@@ -1,15 +1,17 @@
 import os
+import sys
 import unittest
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+from src import cache
 from src import error
+from src import metrics
 from src.rules import langfeat
 from src.rules import valid
 from src.sandbox import safedef
 from src.sandbox import safemod
 from src.sandbox import sandbox
 from src.sandbox.ctxman import monitor
-from src.sandbox.ctxman import timer
 
 
 class TraceTestResult(unittest.TextTestResult):
@@ -41,28 +43,35 @@ class TraceTestResult(unittest.TextTestResult):
 class SafePackage(object):
 
     def __init__(self, course: str, assignment: str, files: Dict[str, str],
-                 min_tests: int, feat_rules: langfeat.FeatRules,
-                 skip_lint: bool = False, skip_type: bool = False) -> None:
+                 min_tests: int, feat_rules: langfeat.CompiledRules,
+                 skip_lint: bool = False, skip_type: bool = False,
+                 load: bool = True,
+                 functions: Optional[cache.FunctionCache] = None,
+                 memory_limit: int = 0, wall_limit: int = 0) -> None:
         # TODO: refactor: add sandbox.update_calls method
         #       change ctxmans into dict and update CallGuard
         self.safemods: List[safemod.SafeModule] = \
             [safemod.SafeModule(path, source) for path, source in files.items()]
         feat_rules = self._update_userdef_calls(feat_rules, self.safemods)
-        self.sandbox: sandbox.Sandbox = self._create_sandbox(tuple(files),
-                                                             feat_rules)
+        self.sandbox: sandbox.Sandbox = self._create_sandbox(
+            tuple(files), feat_rules, memory_limit=memory_limit,
+            wall_limit=wall_limit)
         self.errors: error.ErrorFormatter = \
             valid.validate_package(course, assignment, files, feat_rules,
-                                   self.safemods, skip_lint, skip_type)
-        self._load_modules(min_tests)
+                                   self.safemods, skip_lint, skip_type,
+                                   functions=functions)
+        if load:
+            self.load_modules(min_tests)
 
-    def _update_userdef_calls(self, feat_rules: langfeat.FeatRules,
+    def _update_userdef_calls(self, feat_rules: langfeat.CompiledRules,
                               safemods: List[safemod.SafeModule]
-    ) -> langfeat.FeatRules:
+    ) -> langfeat.CompiledRules:
         defs = [def_name for sm in safemods for def_name in sm.nodes]
         for def_name in defs:
             if def_name.endswith(".__init__"):
                 defs.append(def_name.rsplit(".", maxsplit=1)[0])
-        return langfeat.update_features(feat_rules, "calls", tuple(defs))
+        mod_names = tuple(sm.name for sm in safemods)
+        return feat_rules.extend(tuple(defs), mod_names)
 
     def __getattr__(self, name: str) -> safemod.SafeModule:
         for sm in self.safemods:
@@ -77,14 +86,18 @@ class SafePackage(object):
         return all(sm.module is not None for sm in self.safemods)
 
     def _create_sandbox(self, paths: List[str],
-                        feat_rules: langfeat.FeatRules,
-                        keep_prompt: bool = False) -> sandbox.Sandbox:
-        calls = tuple(feat_rules["calls"])
-        imports = tuple(feat_rules["imports"])
+                        feat_rules: langfeat.CompiledRules,
+                        keep_prompt: bool = False,
+                        memory_limit: int = 0,
+                        wall_limit: int = 0) -> sandbox.Sandbox:
+        calls = feat_rules.get_features("calls")
+        imports = feat_rules.get_features("imports")
         dirname = os.path.dirname(paths[0])
-        return sandbox.Sandbox(calls, imports, dirname, keep_prompt)
+        return sandbox.Sandbox(calls, imports, dirname, keep_prompt,
+                               memory_limit=memory_limit,
+                               wall_limit=wall_limit)
 
-    def _load_modules(self, min_tests: int) -> None:
+    def load_modules(self, min_tests: int) -> None:
         """
         Load the module associated with each SafeModule object in
         |self.safemods|. Return True if all modules were loaded and False if at
@@ -93,9 +106,12 @@ class SafePackage(object):
         Modules that are not test suites are loaded first as they may all need
         to be loaded to run any test suites.
         """
-        self._load_definitions()
+        with metrics.timer("load"):
+            safemod.install(self.safemods)
+            self._load_definitions()
         if self._has_unittests():
-            self._load_unittests(min_tests)
+            with metrics.timer("unittest"):
+                self._load_unittests(min_tests)
 
     def _load_definitions(self) -> None:
         for sm in self.safemods:
@@ -139,8 +155,14 @@ class SafePackage(object):
             load_tests = unittest.defaultTestLoader.loadTestsFromModule
             for tests in load_tests(sm.module):
                 # TODO: mark test as failure if time limit exceeded
-                with timer.Timer(seconds):
-                    result = driver.run(tests)
+                try:
+                    with self.sandbox.get_timer(seconds):
+                        result = driver.run(tests)
+                except error.CaseyTimeoutError:
+                    # expired between tests rather than in one
+                    was_successful = False
+                    tb_list.append(sys.exc_info())
+                    continue
                 if not result.wasSuccessful():
                     was_succesful = False
                     for exc_info in result.tracebacks:
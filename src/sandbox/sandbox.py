@@ -3,32 +3,46 @@ from typing import Any, Tuple, Union
 
 from src import error
 from src.sandbox.ctxman import disable
+from src.sandbox.ctxman import memory
 from src.sandbox.ctxman import suppress
 from src.sandbox.ctxman import timer
 
 
 ContextManager = Union[disable.CallGuard, #disable.ImportGuard,
-                       suppress.Suppressor, timer.Timer]
+                       suppress.Suppressor, timer.Timer, memory.MemoryLimit]
+
+# the context managers entered for each case of a session
+PER_CASE = (timer.Timer, memory.MemoryLimit)
 
 
 class Sandbox(object):
     """Context manager for safely handling a module."""
 
     def __init__(self, calls: Tuple[str, ...], imports: Tuple[str, ...],
-                 dirname: str, keep_prompt: bool) -> None:
+                 dirname: str, keep_prompt: bool,
+                 memory_limit: int = 0, wall_limit: int = 0) -> None:
+        # the Timer is armed last so that it only stops the block itself
         self.ctxmans = (disable.CallGuard(calls, imports, dirname),
                         suppress.Suppressor(keep_prompt=keep_prompt),
-                        timer.Timer(dirname))
+                        memory.MemoryLimit(memory_limit),
+                        timer.Timer(dirname, wall_seconds=wall_limit))
         self.use_disable: bool = True
         self._reclimit = sys.getrecursionlimit()
         self._depth: int = 0
+        self._is_session: bool = False
+        self._is_guarded: bool = False
 
     def __enter__(self) -> "Sandbox":
         if self._depth == 0:
             sys.setrecursionlimit(self._reclimit // 2)
             for cm in self.ctxmans:
-                if self.use_disable or not cm.__module__.endswith(".disable"):
+                if self._is_session and isinstance(cm, PER_CASE):
+                    continue
+                if self.use_disable or not isinstance(cm, disable.CallGuard):
                     cm.__enter__()
+            self._is_guarded = self.use_disable
+        elif self._depth == 1 and self._is_session:
+            self._start_case()
         self._depth += 1
         return self
 
@@ -37,10 +51,50 @@ class Sandbox(object):
         if self._depth == 0:
             sys.setrecursionlimit(self._reclimit)
             for cm in self.ctxmans[::-1]:
-                cm.__exit__()
+                if not (self._is_session and isinstance(cm, PER_CASE)):
+                    cm.__exit__()
+            if self._is_session:
+                # errors outside of the cases are not the submission's
+                self._is_session = False
+                self.use_disable = True
+                return False
+        elif self._depth == 1 and self._is_session:
+            self._stop_case()
         self.use_disable = True
         return True
 
+    def session(self) -> "Sandbox":
+        """
+        Set up the sandbox once for a group of cases, so that entering it for
+        each case only resets stdin, stdout, the timer, and the memory limit:
+
+            with sb.session():
+                for case in cases:
+                    case.run()
+
+        Built-ins are restored when the session ends rather than after each
+        case.
+        """
+        if self._depth == 0:
+            self._is_session = True
+        return self
+
+    def _start_case(self) -> None:
+        guard = self.get_ctxman("CallGuard")
+        if self.use_disable and not self._is_guarded:
+            guard.__enter__()
+        elif not self.use_disable and self._is_guarded:
+            guard.__exit__()
+        self._is_guarded = self.use_disable
+        self.get_ctxman("Suppressor").reset()
+        self.get_ctxman("MemoryLimit").__enter__()
+        self.get_ctxman("Timer").__enter__()
+
+    def _stop_case(self) -> None:
+        self.get_ctxman("Timer").__exit__()
+        self.get_ctxman("MemoryLimit").__exit__()
+        self.get_ctxman("Suppressor").flush()
+
     def __call__(self, stdin: str = "", timeout: int = 0) -> "Sandbox":
         if stdin:
             try:
@@ -54,6 +108,31 @@ class Sandbox(object):
                 pass
         return self
 
+    def set_deadline(self, name: str, seconds: int) -> None:
+        """
+        Stop any block run in the Sandbox after |seconds| of wall-clock time
+        from now, as |name| (e.g. "Submission") exceeded its time.
+        """
+        self.get_ctxman("Timer").set_deadline(name, seconds)
+
+    def get_deadline(self) -> float:
+        """
+        Return the time.monotonic() of the nearest deadline set by
+        |set_deadline|, or 0 if there is none.
+        """
+        return self.get_ctxman("Timer").get_deadline()
+
+    def get_timer(self, seconds: int = 0) -> timer.Timer:
+        """
+        Return a Timer that stops the block after |seconds| of CPU time (if
+        any) or once a deadline set by |set_deadline| passes, for code run
+        outside of the Sandbox (e.g. while importing a module).
+        """
+        cm = self.get_ctxman("Timer")
+        outer = timer.Timer(cm.dirname, seconds=seconds)
+        outer.deadlines = cm.deadlines
+        return outer
+
     def get_ctxman(self, name: str) -> ContextManager:
         """
         Retrieve and return a context manager with the given name from the
@@ -84,6 +163,25 @@ class Sandbox(object):
         """
         return self.get_ctxman("Timer").has_expired
 
+    def get_peak_memory(self) -> int:
+        """
+        Return the peak bytes of memory used by the last block run in the
+        Sandbox, as measured by the MemoryLimit context manager.
+        """
+        return self.get_ctxman("MemoryLimit").peak
+
+    def relabel_memory_error(self, exc_info: error.ExcInfo) -> error.ExcInfo:
+        """
+        Return the exc_info of a MemoryError raised in the Sandbox, with a
+        message stating the limit exceeded if the MemoryLimit context manager
+        enforces one.
+        """
+        cm = self.get_ctxman("MemoryLimit")
+        if not cm.limit or exc_info[1].args:
+            return exc_info
+        exc = MemoryError(cm.get_message()).with_traceback(exc_info[2])
+        return MemoryError, exc, exc_info[2]
+
 #    def load_module(self, name: str, source: str) -> types.ModuleType:
 #        """
 #        Dynamically load a module with the given name and source code.
@@ -0,0 +1,112 @@
+import glob
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from src import utils
+
+
+class Job(object):
+    """A submission waiting in, or taken from, the zygote's grading queue."""
+
+    def __init__(self, args: Tuple[Any, ...], kwargs: Dict[str, Any],
+                 conn: Optional[Any] = None, stream: bool = False) -> None:
+        self.id: str = uuid.uuid4().hex
+        self.args: Tuple[Any, ...] = args
+        self.kwargs: Dict[str, Any] = kwargs
+        self.conn = conn
+        self.stream: bool = stream
+        self.key: Tuple[str, str, str] = tuple(args[:3])
+        self.created: float = time.time()
+
+    def is_async(self) -> bool:
+        return self.conn is None
+
+    def update(self, status: str, output: str = "", **extra) -> None:
+        """Record the job's status so that it can be polled by the client."""
+        if self.is_async():
+            write_status(*self.key, self.id, status, output, **extra)
+
+
+def get_jobs_dirname(course: str, assignment: str, username: str) -> str:
+    return os.path.join(utils.get_submit_dirname(course, assignment, username),
+                        "jobs")
+
+
+def is_valid_id(job_id: str) -> bool:
+    return bool(re.fullmatch(r"[0-9a-f]{32}", job_id))
+
+
+def write_status(course: str, assignment: str, username: str, job_id: str,
+                 status: str, output: str = "", keep: int = 10,
+                 **extra) -> None:
+    """
+    Atomically write the status of a job and remove all but the |keep| most
+    recently updated jobs of the user.
+    """
+    dirname = get_jobs_dirname(course, assignment, username)
+    os.makedirs(dirname, mode=0o700, exist_ok=True)
+    path = os.path.join(dirname, job_id + ".json")
+    record = {"status": status, "output": output, "updated": time.time()}
+    record.update(extra)
+    with open(path + ".tmp", "w") as fp:
+        json.dump(record, fp)
+    os.chmod(path + ".tmp", 0o600)
+    os.replace(path + ".tmp", path)
+    paths = sorted((os.path.join(dirname, name) for name in os.listdir(dirname)
+                    if name.endswith(".json")), key=os.path.getmtime)
+    for old_path in paths[:-keep]:
+        os.remove(old_path)
+
+
+def read_status(course: str, assignment: str, username: str,
+                job_id: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(get_jobs_dirname(course, assignment, username),
+                        job_id + ".json")
+    if not is_valid_id(job_id) or not os.path.exists(path):
+        return None
+    with open(path, "r") as fp:
+        return json.load(fp)
+
+
+def fail_orphans() -> int:
+    """
+    Mark as failed the jobs left queued by a zygote that has exited, and the
+    jobs left running by a grader that has exited, so that their clients do
+    not poll them forever. Return the number of jobs marked.
+    """
+    count = 0
+    for path in glob.glob(os.path.join(utils.get_root_dirname(), "*", "*",
+                                       "*", "jobs", "*.json")):
+        try:
+            with open(path, "r") as fp:
+                record = json.load(fp)
+        except (OSError, ValueError):
+            continue
+        if record["status"] == "queued" or (
+                record["status"] == "running"
+                and not _is_alive(record.get("pid", 0))):
+            submit_dirname = os.path.dirname(os.path.dirname(path))
+            assignment_dirname = os.path.dirname(submit_dirname)
+            write_status(os.path.basename(os.path.dirname(assignment_dirname)),
+                         os.path.basename(assignment_dirname),
+                         os.path.basename(submit_dirname),
+                         os.path.basename(path)[:-len(".json")], "error",
+                         traceback="Job orphaned by an exited grader")
+            count += 1
+    return count
+
+
+def _is_alive(pid: int) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
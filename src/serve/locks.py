@@ -0,0 +1,48 @@
+from typing import Any, Dict, Optional, Tuple
+
+from src.serve import jobs
+
+
+Key = Tuple[str, str, str]
+
+
+class LockManager(object):
+    """
+    Track one running and at most one pending submission per (course,
+    assignment, username). A newer submission supersedes the pending one
+    (latest wins) instead of being rejected.
+    """
+
+    def __init__(self) -> None:
+        self.running: Dict[Key, jobs.Job] = {}
+        self.pending: Dict[Key, jobs.Job] = {}
+        self.coalesced: int = 0
+
+    def offer(self, job: jobs.Job) -> Optional[jobs.Job]:
+        """
+        Register a newly queued job and return the pending job of the same
+        user that it supersedes, if any.
+        """
+        superseded = self.pending.get(job.key)
+        self.pending[job.key] = job
+        if superseded:
+            self.coalesced += 1
+        return superseded
+
+    def acquire(self, job: jobs.Job) -> bool:
+        """Return True if the job may start grading and False otherwise."""
+        if job.key in self.running:
+            return False
+        self.running[job.key] = job
+        if self.pending.get(job.key) is job:
+            del self.pending[job.key]
+        return True
+
+    def release(self, job: jobs.Job) -> None:
+        if self.running.get(job.key) is job:
+            del self.running[job.key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": sorted("/".join(key) for key in self.running),
+                "pending": sorted("/".join(key) for key in self.pending),
+                "coalesced": self.coalesced}
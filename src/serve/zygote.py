@@ -0,0 +1,419 @@
+import collections
+import fcntl
+import importlib
+import multiprocessing.connection
+import os
+import socket
+import stat
+import time
+import traceback
+from typing import Any, Deque, Dict, Iterator, List, Tuple
+
+from src import casey
+from src import error
+from src import metrics
+from src import tracelog
+from src import utils
+from src.rules import snapshot
+from src.serve import jobs
+from src.serve import locks
+from src.static import analysis
+
+
+Connection = multiprocessing.connection.Connection
+
+
+class Supervisor(object):
+    """
+    Client side of the grading zygote. The zygote is forked once from the
+    server process, imports the heavy grading dependencies, and then forks a
+    throwaway child for each submission so that student code never runs in a
+    long-lived process. At most |capacity| children grade at once; any other
+    submissions wait in the zygote's queue, where a newer submission from the
+    same user supersedes one that has not started grading yet. If the zygote
+    has died, the next request forks a new one from the server process that
+    makes it.
+    """
+
+    def __init__(self, address: str, capacity: int = 10) -> None:
+        self.address: str = address
+        self.capacity: int = capacity
+        self.pid: int = 0
+
+    def start(self) -> None:
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.address)
+        server.listen(128)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _detach_sockets(server.fileno())
+                Zygote(server, self.capacity).serve()
+            finally:
+                os._exit(0)
+        server.close()
+        self.pid = pid
+
+    def run(self, course: str, assignment: str, username: str,
+            files: Dict[str, str], **kwargs) -> str:
+        """Grade a submission in a child of the zygote and return the output."""
+        return "".join(self._read("run", (course, assignment, username, files),
+                                  kwargs))
+
+    def stream(self, course: str, assignment: str, username: str,
+               files: Dict[str, str], **kwargs) -> Iterator[str]:
+        """
+        Grade a submission in a child of the zygote and yield its output as
+        each part is produced.
+        """
+        return self._read("stream", (course, assignment, username, files),
+                          kwargs)
+
+    def submit(self, course: str, assignment: str, username: str,
+               files: Dict[str, str], **kwargs) -> str:
+        """Queue a submission for grading and return its job ID."""
+        return self._request("submit", (course, assignment, username, files),
+                             kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request("stats")
+
+    def metrics(self) -> str:
+        """Return the zygote's metrics in the Prometheus text format."""
+        return self._request("metrics")
+
+    def _read(self, command: str, *args) -> Iterator[str]:
+        conn = self._connect()
+        try:
+            conn.send((command,) + args)
+            while True:
+                chunk = conn.recv()
+                if chunk is None:
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield chunk
+        finally:
+            conn.close()
+
+    def _request(self, command: str, *args) -> Any:
+        conn = self._connect()
+        try:
+            conn.send((command,) + args)
+            return conn.recv()
+        finally:
+            conn.close()
+
+    def _connect(self) -> Connection:
+        """
+        Connect to the zygote, starting a new one if it is not running. The
+        server processes that find it dead take turns holding a lock on
+        <address>.lock so that only the first of them starts a new one.
+        """
+        try:
+            return multiprocessing.connection.Client(self.address,
+                                                     family="AF_UNIX")
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+        fd = os.open(self.address + ".lock", os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                return multiprocessing.connection.Client(self.address,
+                                                         family="AF_UNIX")
+            except (ConnectionRefusedError, FileNotFoundError):
+                self.start()
+            return multiprocessing.connection.Client(self.address,
+                                                     family="AF_UNIX")
+        finally:
+            os.close(fd)
+
+
+class Zygote(object):
+
+    def __init__(self, server: socket.socket, capacity: int) -> None:
+        self.server: socket.socket = server
+        self.capacity: int = capacity
+        self.parent: int = os.getppid()
+        self.queue: Deque[jobs.Job] = collections.deque()
+        self.locks: locks.LockManager = locks.LockManager()
+        self.children: Dict[int, Tuple[Connection, jobs.Job]] = {}
+        # accepted connections whose request has not been received
+        self.accepted: List[Connection] = []
+        self.latencies: Deque[float] = collections.deque(maxlen=1000)
+        self.cold_start: float = 0.0
+        self.metrics: metrics.Registry = metrics.Registry()
+
+    def serve(self) -> None:
+        try:
+            # the queue of any previous zygote was lost with it
+            jobs.fail_orphans()
+        except OSError:
+            pass
+        self.cold_start = _measure_cold_start()
+        _preload()
+        try:
+            analysis.preload_linters()
+        except Exception:
+            # each child reports the error when it lints its submission
+            pass
+        flushed = time.monotonic()
+        while os.getppid() == self.parent:
+            readers = ([self.server] + self.accepted
+                       + [reader for reader, _ in self.children.values()])
+            for reader in multiprocessing.connection.wait(readers, timeout=1):
+                if reader is self.server:
+                    self._accept()
+                elif reader in self.accepted:
+                    self._handle(reader)
+                else:
+                    self._receive(reader)
+            self._reap()
+            self._dispatch()
+            if time.monotonic() - flushed >= 5:
+                tracelog.flush()
+                flushed = time.monotonic()
+        tracelog.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {"cold_start": round(self.cold_start, 4),
+                "fork_latency": {
+                    "count": len(latencies),
+                    "p50": round(utils.percentile(latencies, 50), 4),
+                    "p95": round(utils.percentile(latencies, 95), 4),
+                    "max": round(max(latencies, default=0.0), 4)},
+                "active": len(self.children),
+                "capacity": self.capacity,
+                "queued": len(self.queue),
+                "locks": self.locks.stats()}
+
+    def format_metrics(self) -> str:
+        """
+        Return the stage latency histograms along with the queue depth and
+        saturation of the graders.
+        """
+        latencies = list(self.latencies)
+        return self.metrics.format({
+            "queue_depth": len(self.queue),
+            "graders_active": len(self.children),
+            "graders_capacity": self.capacity,
+            "graders_saturation": round(len(self.children) / self.capacity, 4),
+            "submissions_coalesced": self.locks.coalesced,
+            "fork_latency_p95_seconds":
+                round(utils.percentile(latencies, 95), 6),
+            "cold_start_seconds": round(self.cold_start, 6)})
+
+    def _accept(self) -> None:
+        """
+        Accept a connection, whose request is received once it is ready so
+        that a slow client does not stall the zygote.
+        """
+        sock, _ = self.server.accept()
+        self.accepted.append(Connection(sock.detach()))
+
+    def _handle(self, conn: Connection) -> None:
+        self.accepted.remove(conn)
+        try:
+            message = conn.recv()
+        except EOFError:
+            conn.close()
+            return
+        if message[0] in ("run", "stream"):
+            self._enqueue(jobs.Job(*message[1:], conn=conn,
+                                   stream=message[0] == "stream"))
+        elif message[0] == "submit":
+            job = jobs.Job(*message[1:])
+            job.update("queued")
+            self._enqueue(job)
+            conn.send(job.id)
+            conn.close()
+        elif message[0] == "metrics":
+            conn.send(self.format_metrics())
+            conn.close()
+        else:
+            conn.send(self.stats())
+            conn.close()
+
+    def _enqueue(self, job: jobs.Job) -> None:
+        superseded = self.locks.offer(job)
+        if superseded:
+            self.queue.remove(superseded)
+            superseded.update("superseded")
+            tracelog.write(tracelog.make_record(*superseded.key, "superseded",
+                                                is_traced=False,
+                                                job=superseded.id))
+            if superseded.conn:
+                superseded.conn.send(f"[{job.key[2]}] Submission superseded by"
+                                     " a newer submission.\n")
+                superseded.conn.send(None)
+                superseded.conn.close()
+        self.queue.append(job)
+
+    def _dispatch(self) -> None:
+        for job in list(self.queue):
+            if len(self.children) >= self.capacity:
+                break
+            if self.locks.acquire(job):
+                self.queue.remove(job)
+                self._fork(job)
+
+    def _fork(self, job: jobs.Job) -> None:
+        _load_snapshot(*job.key[:2])
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        forked = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.server.close()
+                for other, _ in self.children.values():
+                    other.close()
+                for other in self.accepted:
+                    other.close()
+                for queued in self.queue:
+                    if queued.conn:
+                        queued.conn.close()
+                reader.close()
+                _grade(job, writer, forked)
+            finally:
+                os._exit(0)
+        writer.close()
+        if job.conn:
+            job.conn.close()
+        self.children[pid] = (reader, job)
+
+    def _receive(self, reader: Connection) -> None:
+        try:
+            name, value = reader.recv()
+        except EOFError:
+            for pid, (other, _) in list(self.children.items()):
+                if other is reader:
+                    self._finish(pid)
+            return
+        if name == "latency":
+            self.latencies.append(value)
+        elif name == "record":
+            self.metrics.observe(value["course"], value["assignment"],
+                                 value["stages"])
+            tracelog.write(value)
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self._finish(pid)
+
+    def _finish(self, pid: int) -> None:
+        if pid in self.children:
+            reader, job = self.children.pop(pid)
+            reader.close()
+            self.locks.release(job)
+
+
+def _grade(job: jobs.Job, status: Connection, forked: float) -> None:
+    """Run one submission inside a freshly forked child of the zygote."""
+    if job.conn:
+        job.conn.send("")
+    job.update("running", pid=os.getpid())
+    status.send(("latency", time.monotonic() - forked))
+    output = ""
+    result, fields = "done", {}
+    try:
+        with metrics.timer("total"):
+            if job.stream:
+                for chunk in casey.stream(*job.args, **job.kwargs):
+                    job.conn.send(chunk)
+                    output += chunk
+            else:
+                output = casey.run(*job.args, **job.kwargs)
+    except BaseException:
+        if job.conn:
+            job.conn.send(error.CaseyRuntimeError(traceback.format_exc()))
+        job.update("error", traceback=traceback.format_exc())
+        result, fields = "error", {"traceback": traceback.format_exc()}
+    else:
+        if job.conn and not job.stream:
+            job.conn.send(output)
+        job.update("done", output)
+    if job.conn:
+        job.conn.send(None)
+        job.conn.close()
+    status.send(("record", tracelog.make_record(
+        *job.key, result, job=job.id, **fields)))
+    status.close()
+
+
+def _detach_sockets(keep: int) -> None:
+    """
+    Point every socket inherited by a new zygote other than |keep| (e.g. the
+    connection of the request whose server process started it) at /dev/null,
+    so that each is closed once the process that owns it closes it. The file
+    descriptors stay open so that they are not reused while the inherited
+    objects that own them are alive.
+    """
+    null = os.open(os.devnull, os.O_RDWR)
+    for name in os.listdir("/proc/self/fd"):
+        fd = int(name)
+        if fd in (keep, null):
+            continue
+        try:
+            if stat.S_ISSOCK(os.fstat(fd).st_mode):
+                os.dup2(null, fd)
+        except OSError:
+            pass
+    os.close(null)
+
+
+def _load_snapshot(course: str, assignment: str) -> None:
+    """
+    Load the rules of the assignment in the zygote so that each child inherits
+    the parsed snapshot instead of parsing the config files itself.
+    """
+    if not os.path.isdir(utils.get_assignment_dirname(course, assignment)):
+        return
+    try:
+        snapshot.load(course, assignment)
+    except Exception:
+        # the child reports the error when it grades the submission
+        pass
+
+
+def _preload() -> None:
+    """Import the modules that are otherwise loaded on first submission."""
+    for name in ("mypy.main", "mypy.build", "pylint.lint"):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _measure_cold_start() -> float:
+    """
+    Return the number of seconds a freshly forked server worker spends
+    loading the grading dependencies before it can send its first byte.
+    """
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reader.close()
+            _preload()
+            writer.send(True)
+        finally:
+            os._exit(0)
+    writer.close()
+    try:
+        reader.recv()
+    except EOFError:
+        pass
+    elapsed = time.monotonic() - started
+    reader.close()
+    os.waitpid(pid, 0)
+    return elapsed
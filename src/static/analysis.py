@@ -1,19 +1,44 @@
-import json
+import ast
+import contextlib
+import fcntl
+import glob
+import hashlib
+import inspect
 import os
+import platform
 import re
-from typing import Dict, List, Tuple
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple
 
+import astroid
+import pylint
 from mypy import api
-from pylint import epylint
+from mypy import version
+from pylint import lint
+from pylint import reporters
 
+from src import cache
 from src import error
 from src import utils
+from src.rules import snapshot
+
+
+# the versions of the interpreter and tools that grading depends on
+TOOL_VERSIONS = ("python " + platform.python_version(),
+                 "pylint " + pylint.__version__,
+                 "astroid " + astroid.__version__,
+                 "mypy " + version.__version__)
 
 
 def check_style(errors: error.ErrorFormatter, course: str, assignment: str,
                 paths: Tuple[str, ...]) -> None:
-    cfg_path = _get_cfg_path(course, assignment, "pylint.cfg")
-    for error in _make_report(paths, cfg_path):
+    cfg_path = snapshot.load(course, assignment).get_cfg_path("pylint.cfg")
+    report = _check_cached(course, assignment, paths, cfg_path,
+                           "pylint " + pylint.__version__,
+                           lambda paths: _split_report(paths, cfg_path),
+                           is_cross_file=True)
+    for error in report:
         name = error["module"]
         if error["obj"]:
             name += "." + error["obj"]
@@ -21,28 +46,264 @@ def check_style(errors: error.ErrorFormatter, course: str, assignment: str,
         errors.add(name, message, hidden=False, linenos={int(error["line"])})
 
 
-def _make_report(paths: Tuple[str, ...], cfg_path: str) -> Dict[str, str]:
-    arg_str = " ".join(paths) + f" --rcfile={cfg_path}"
-    stdout = epylint.py_run(arg_str, return_std=True)[0].getvalue()
-    if not stdout:
-        return {}
-    return json.loads(stdout)
+def _check_cached(course: str, assignment: str, paths: Tuple[str, ...],
+                  cfg_path: str, tool: str,
+                  check: Callable[[Tuple[str, ...]], Dict[str, List[Any]]],
+                  is_cross_file: bool = False) -> List[Any]:
+    """
+    Return the diagnostics of every file, running |check| on all of the files
+    unless the diagnostics of each are cached. |check| returns the
+    diagnostics of each file it is given, keyed by file name. The files are
+    always checked together so that checks across files (e.g. pylint's
+    duplicate-code and cyclic-import) see every file.
+
+    The diagnostics of a file are cached under the name and contents of the
+    file and of the sibling modules it imports (directly or indirectly), or of
+    every file if |is_cross_file|, the contents of |cfg_path|, and the name
+    and version of the |tool|.
+    """
+    diagnostics = cache.DiskCache(os.path.join(
+        utils.get_cache_dirname(course, assignment), "static"), 2000)
+    keys = _get_file_keys(paths, cfg_path, tool, is_cross_file)
+    found = {path: diagnostics.get(keys[path]) for path in paths}
+    if any(found[path] is None for path in paths):
+        checked = check(paths)
+        for path in paths:
+            found[path] = checked.get(os.path.basename(path), [])
+            diagnostics.put(keys[path], found[path])
+    return [item for path in paths for item in found[path]]
+
+
+def _get_file_keys(paths: Tuple[str, ...], cfg_path: str, tool: str,
+                   is_cross_file: bool) -> Dict[str, str]:
+    sources = {}
+    for path in paths:
+        with open(path, "r") as fp:
+            sources[utils.get_basename(path)] = fp.read()
+    with open(cfg_path, "r") as fp:
+        cfg = fp.read()
+    keys = {}
+    for path in paths:
+        if is_cross_file:
+            names = sorted(sources)
+        else:
+            names = sorted(_get_sibling_imports(utils.get_basename(path),
+                                                sources))
+        keys[path] = cache.make_key(tool, cfg, os.path.basename(path),
+                                    [[name, sources[name]] for name in names])
+    return keys
+
+
+def _get_sibling_imports(name: str, sources: Dict[str, str]) -> Set[str]:
+    """
+    Return the name of the module and of every module in |sources| that it
+    imports directly or indirectly.
+    """
+    found = set()
+    pending = [name]
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        try:
+            root = ast.parse(sources[name])
+        except SyntaxError:
+            continue
+        for node in ast.walk(root):
+            if isinstance(node, ast.Import):
+                pending += [alias.name.split(".")[0] for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                pending.append(node.module.split(".")[0])
+        pending = [other for other in pending if other in sources]
+    return found
+
+
+def _split_report(paths: Tuple[str, ...],
+                  cfg_path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Lint the files and return the messages of each file."""
+    report = {os.path.basename(path): [] for path in paths}
+    for message in _make_report(paths, cfg_path):
+        report.setdefault(os.path.basename(message["path"]), []).append(message)
+    return report
+
+
+# the argument of lint.Run that stops it from exiting, which pylint 2.5 names
+# do_exit
+_EXIT_ARG = ("exit" if "exit" in inspect.signature(lint.Run).parameters
+             else "do_exit")
+
+# pylint.cfg path -> (modification time, linter)
+_linters: Dict[str, Tuple[float, lint.PyLinter]] = {}
+
+
+class _Collector(reporters.BaseReporter):
+    """Collect messages in the format of pylint's JSON reporter."""
+
+    name = "casey"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: List[Dict[str, Any]] = []
+
+    def handle_message(self, msg) -> None:
+        self.messages.append({"type": msg.category, "module": msg.module,
+                              "obj": msg.obj, "line": msg.line,
+                              "column": msg.column, "path": msg.path,
+                              "symbol": msg.symbol, "message": msg.msg or "",
+                              "message-id": msg.msg_id})
+
+    def display_messages(self, layout) -> None:
+        pass
+
+    def display_reports(self, layout) -> None:
+        pass
+
+    def _display(self, layout) -> None:
+        pass
+
+
+def _make_report(paths: Tuple[str, ...],
+                 cfg_path: str) -> List[Dict[str, Any]]:
+    """
+    Lint the files in this process with the linter kept for |cfg_path|, so
+    that the config is only read once (or again if it is modified) and
+    astroid's inference of the standard library is reused.
+    """
+    collector = _Collector()
+    mtime = os.path.getmtime(cfg_path)
+    if cfg_path not in _linters or _linters[cfg_path][0] != mtime:
+        run = lint.Run(list(paths) + [f"--rcfile={cfg_path}"],
+                       reporter=collector, **{_EXIT_ARG: False})
+        _linters[cfg_path] = (mtime, run.linter)
+    else:
+        linter = _linters[cfg_path][1]
+        linter.set_reporter(collector)
+        linter.check(list(paths))
+    _forget_modules(paths)
+    return collector.messages
+
+
+def _forget_modules(paths: Tuple[str, ...]) -> None:
+    """
+    Remove the submitted modules from astroid's cache, which would otherwise
+    return them unchanged when a file at the same path is linted again.
+    """
+    dirnames = {os.path.dirname(os.path.abspath(path)) for path in paths}
+    cached = astroid.MANAGER.astroid_cache
+    for name, module in list(cached.items()):
+        if module.file and os.path.dirname(module.file) in dirnames:
+            del cached[name]
+
+
+def preload_linters() -> None:
+    """
+    Create the linter of every pylint.cfg in the cases directory by linting
+    an empty module, so that the first submissions do not pay for it.
+    """
+    pattern = os.path.join(utils.get_top_dirname(), "cases", "**",
+                           "pylint.cfg")
+    with tempfile.TemporaryDirectory() as dirname:
+        path = os.path.join(dirname, "preload.py")
+        with open(path, "w") as fp:
+            fp.write("print(len(str(1)))\n")
+        for cfg_path in glob.glob(pattern, recursive=True):
+            _make_report((path,), cfg_path)
 
 
 def check_types(errors: error.ErrorFormatter, course: str, assignment: str,
                 paths: Tuple[str, ...]) -> None:
-    cfg_path = _get_cfg_path(course, assignment, "mypy.cfg")
-    report = _run_mypy(paths, cfg_path)
+    cfg_path = snapshot.load(course, assignment).get_cfg_path("mypy.cfg")
+    report = "".join(_check_cached(
+        course, assignment, paths, cfg_path, "mypy " + version.__version__,
+        lambda paths: _check_mypy(course, assignment, paths, cfg_path)))
 #    _parse_module_errors(errors, report)
     _parse_function_errors(errors, report)
 
 
-def _run_mypy(paths: Tuple[str, ...], cfg_path: str) -> List[str]:
-    args = list(paths) + ["--config-file", cfg_path, "--no-strict-optional",
-                          "--no-incremental"]
+def _check_mypy(course: str, assignment: str, paths: Tuple[str, ...],
+                cfg_path: str) -> Dict[str, List[str]]:
+    with _claim_mypy_cache(course, assignment, cfg_path) as cache_dirname:
+        return _split_mypy(_run_mypy(paths, cfg_path, cache_dirname), paths)
+
+
+def _run_mypy(paths: Tuple[str, ...], cfg_path: str,
+              cache_dirname: str = "") -> str:
+    """
+    Type check the files, keeping mypy's incremental cache in |cache_dirname|
+    (if given) so that typeshed's stubs are only checked on the first run.
+    mypy does not cache modules with errors, so their errors are always
+    reported.
+    """
+    args = list(paths) + ["--config-file", cfg_path, "--no-strict-optional"]
+    if cache_dirname:
+        args += ["--cache-dir", cache_dirname]
+    else:
+        args.append("--no-incremental")
     return api.run(args)[0]
 
 
+def _split_mypy(report: str, paths: Tuple[str, ...]) -> Dict[str, List[str]]:
+    """
+    Return the lines of the report about each of the files, without the
+    directory of the file. Lines about imported modules that were not among
+    |paths| are dropped, as are summary lines.
+    """
+    lines = {os.path.basename(path): [] for path in paths}
+    for line in report.splitlines(True):
+        match = re.match(r"^(.*?\.pyi?):", line)
+        if match and os.path.basename(match.group(1)) in lines:
+            lines[os.path.basename(match.group(1))].append(
+                os.path.basename(match.group(1)) + line[match.end(1):])
+    return lines
+
+
+@contextlib.contextmanager
+def _claim_mypy_cache(course: str, assignment: str,
+                      cfg_path: str) -> Iterator[str]:
+    """
+    Yield a mypy cache directory of the assignment that no other grader uses
+    until the block exits, so that concurrent graders never read or write the
+    same cache. Each directory is claimed by an exclusive lock on its lock
+    file, and a new directory is added when every other one is claimed.
+    """
+    parent = _get_mypy_cache(course, assignment, cfg_path)
+    os.makedirs(parent, exist_ok=True)
+    slot = 0
+    while True:
+        fd = os.open(os.path.join(parent, f"{slot}.lock"),
+                     os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            slot += 1
+            continue
+        try:
+            yield os.path.join(parent, str(slot))
+        finally:
+            os.close(fd)
+        return
+
+
+def _get_mypy_cache(course: str, assignment: str, cfg_path: str) -> str:
+    """
+    Return the parent of the mypy cache directories of the assignment for the
+    contents of |cfg_path| and the installed version of mypy, removing those
+    of any previous config or version.
+    """
+    hash_fun = hashlib.sha256(version.__version__.encode())
+    with open(cfg_path, "rb") as fp:
+        hash_fun.update(fp.read())
+    parent = os.path.join(utils.get_cache_dirname(course, assignment), "mypy")
+    name = hash_fun.hexdigest()[:16]
+    if os.path.isdir(parent):
+        for other in os.listdir(parent):
+            if other != name:
+                shutil.rmtree(os.path.join(parent, other), ignore_errors=True)
+    return os.path.join(parent, name)
+
+
 def _parse_module_errors(errors: error.ErrorFormatter, report: str) -> None:
     """
     Format of line:
@@ -75,14 +336,3 @@ def _parse_function_errors(errors: error.ErrorFormatter, report: str) -> None:
             name = modname + "." + function
             message = f"[mypy:{code}]\n" + message
             errors.add(name, message, hidden=False, linenos={int(lineno)})
-
-
-def _get_cfg_path(course: str, assignment: str, filename: str) -> str:
-    parent = utils.get_top_dirname()
-    paths = [os.path.join(parent, "cases", course, assignment, filename),
-             os.path.join(parent, "cases", course, filename),
-             os.path.join(parent, "cases", filename)]
-    for path in paths:
-        if os.path.exists(path):
-            return path
-    raise FileNotFoundError
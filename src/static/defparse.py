@@ -1,5 +1,33 @@
 import ast
-from typing import Dict, List, Set
+import functools
+from typing import Callable, Dict, Set, Tuple
+
+
+# category -> feature -> line numbers
+Features = Dict[str, Dict[str, Set[int]]]
+Handler = Callable[[Features, ast.AST, ast.FunctionDef], None]
+
+CATEGORIES = ("calls", "exceptions", "keywords", "operators", "types")
+
+
+def parse_features(root: ast.FunctionDef,
+                   categories: Tuple[str, ...] = CATEGORIES) -> Features:
+    """
+    Return a mapping of each category in |categories| to the mapping returned
+    by its parse_* function, walking the AST of the function only once. Each
+    node is dispatched on its type to the handlers of the categories that use
+    it.
+    """
+    features = {category: {} for category in categories}
+    # TODO: use more robust method of ignoring types in test case functions
+    if root.name.startswith("test_"):
+        categories = tuple(category for category in categories
+                           if category != "types")
+    dispatch = _get_dispatch(categories)
+    for node in ast.walk(root):
+        for handler in dispatch.get(type(node), ()):
+            handler(features, node, root)
+    return features
 
 
 def parse_exceptions(root: ast.FunctionDef) -> Dict[str, Set[int]]:
@@ -7,28 +35,7 @@ def parse_exceptions(root: ast.FunctionDef) -> Dict[str, Set[int]]:
     Return a mapping of exception names to the line numbers where those
     exceptions were used.
     """
-    exceptions = {}
-    allowed = ("AssertionError", "AttributeError", "EOFError", "IndexError",
-               "KeyError", "RuntimeError", "TypeError", "ValueError",
-               "ZeroDivisionError")
-    for node in ast.walk(root):
-        if isinstance(node, ast.ExceptHandler):
-            if node.type is None:
-                exceptions.setdefault("BaseException", set()).add(node.lineno)
-            elif hasattr(node.type, "elts"):
-                for elt in node.type.elts:
-                    if elt.id not in allowed:
-                        exceptions.setdefault(elt.id, set()).add(node.lineno)
-            elif hasattr(node.type, "id") and node.type.id not in allowed:
-                exceptions.setdefault(node.type.id, set()).add(node.lineno)
-        elif isinstance(node, ast.Raise):
-            if isinstance(node.exc, ast.Call):
-                # TODO: support node.func.attr
-                name = node.exc.func.id + "(...)"
-                exceptions.setdefault(name, set()).add(node.lineno)
-            elif hasattr(node, "id") and node.id not in allowed:
-                exceptions.setdefault(node.id, set()).add(node.lineno)
-    return exceptions
+    return parse_features(root, ("exceptions",))["exceptions"]
 
 
 def parse_calls(root: ast.FunctionDef) -> Dict[str, Set[int]]:
@@ -36,20 +43,7 @@ def parse_calls(root: ast.FunctionDef) -> Dict[str, Set[int]]:
     Return a mapping of function names to the line numbers where those
     functions were called.
     """
-    calls = {}
-    for node in ast.walk(root):
-        if isinstance(node, ast.Call):
-            if isinstance(node.func, ast.Name):  # built-in functions
-                calls.setdefault(node.func.id, set()).add(node.lineno)
-
-    # TODO: detect type of calling object for method calls
-#            elif isinstance(node.func, ast.Attribute):
-#                calling_obj = getattr(node.func.value, "id", "") 
-#                if calling_obj != "self":
-#                    method_name = calling_obj + "." + node.func.attr
-#                    calls.setdefault(method_name, set()).add(node.lineno)
-
-    return calls
+    return parse_features(root, ("calls",))["calls"]
 
 
 def parse_keywords(root: ast.FunctionDef) -> Dict[str, Set[int]]:
@@ -58,41 +52,7 @@ def parse_keywords(root: ast.FunctionDef) -> Dict[str, Set[int]]:
     keywords were used. Ignore the occurrence of |def| on the first line of the
     function, but not when used for nested functions.
     """
-    keywords = {}
-    for node in ast.walk(root):
-        keyword = _get_keyword(node)
-        if keyword and (keyword != "def" or node.lineno > root.lineno):
-            keywords.setdefault(keyword, set()).add(node.lineno)
-    return keywords
-
-
-def _get_keyword(node: ast.AST) -> str:
-    """
-    Given an AST node, return a string representing the keyword with which it
-    corresponds, or an empty string otherwise.
-    """
-    kw_map = {  "assert": (ast.Assert,),
-                 "break": (ast.Break,),
-                 "class": (ast.ClassDef,),
-              "continue": (ast.Continue,),
-                   "def": (ast.FunctionDef, ast.AsyncFunctionDef),
-                   "del": (ast.Delete,),
-                   "for": (ast.For, ast.AsyncFor),
-                "global": (ast.Global,),
-                    "if": (ast.If,),
-                "import": (ast.Import, ast.ImportFrom),
-                "lambda": (ast.Lambda,),
-              "nonlocal": (ast.Nonlocal,),
-                 "raise": (ast.Raise,),
-                "return": (ast.Return,),
-                   "try": (ast.Try,),
-                 "while": (ast.While,),
-                  "with": (ast.With, ast.AsyncWith),
-                 "yield": (ast.Yield, ast.YieldFrom)}
-    for key, cls_list in kw_map.items():
-        if isinstance(node, cls_list):
-            return key
-    return ""
+    return parse_features(root, ("keywords",))["keywords"]
 
 
 def parse_operators(root: ast.FunctionDef) -> Dict[str, Set[int]]:
@@ -110,107 +70,231 @@ def parse_operators(root: ast.FunctionDef) -> Dict[str, Set[int]]:
               Slicing | xs[1:]         | "slice"
         If-Expression | 1 if xs else 0 | "ifexp"
     """
-    operators = {}
-    for node in ast.walk(root):
-        if isinstance(node, ast.IfExp):
-            operators.setdefault("ifexp", set()).add(node.lineno)
-        elif isinstance(node, ast.Subscript):
-            if isinstance(node.slice, ast.Index):
-                operators.setdefault("index", set()).add(node.lineno)
-            elif isinstance(node.slice, (ast.Slice, ast.ExtSlice)):
-                operators.setdefault("slice", set()).add(node.lineno)
-        elif isinstance(node, ast.Compare):
-            for node_op in node.ops:
-                op = _get_op(node_op)
-                if op:
-                    operators.setdefault(op, set()).add(node.lineno)
-                    if isinstance(node_op, (ast.Not, ast.IsNot, ast.NotIn)):
-                        operators.setdefault("not", set()).add(node.lineno)
-        elif isinstance(node, (ast.UnaryOp, ast.BinOp, ast.BoolOp,
-                               ast.AugAssign)):
-            op = _get_op(node.op)
-            if op:
-                operators.setdefault(op, set()).add(node.lineno)
-        elif isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
-            operators.setdefault("store", set()).add(node.lineno)
-    return operators
+    return parse_features(root, ("operators",))["operators"]
 
 
-def _get_op(node: ast.AST) -> str:
+def parse_types(root: ast.FunctionDef) -> Dict[str, Set[int]]:
     """
-    Given an AST node, return a string representing the operator with which it
-    corresponds, or an empty string otherwise.
+    Return a mapping of Python built-in data types to the line numbers where
+    those types were used, which includes the use of built-in casting functions.
     """
-    op_map = {  "+": (ast.UAdd, ast.Add),
-                "-": (ast.USub, ast.Sub),
-                "*": (ast.Mult,),
-               "**": (ast.Pow,),
-                "/": (ast.Div,),
-               "//": (ast.FloorDiv,),
-                "%": (ast.Mod,),
-               "==": (ast.Eq,),
-               "!=": (ast.NotEq,),
-                "<": (ast.Lt,),
-                ">": (ast.Gt,),
-               "<=": (ast.LtE,),
-               ">=": (ast.GtE,),
-              "and": (ast.And,),
-               "or": (ast.Or,),
-               "in": (ast.In, ast.NotIn),
-               "is": (ast.Is, ast.IsNot),
-                "~": (ast.Invert,),
-                "&": (ast.BitAnd,),
-                "|": (ast.BitOr,),
-                "^": (ast.BitXor,),
-               "<<": (ast.LShift,),
-               ">>": (ast.RShift,)}
-    for key, cls_list in op_map.items():
-        if isinstance(node, cls_list):
-            return key
-    return ""
+    return parse_features(root, ("types",))["types"]
 
 
-def parse_types(root: ast.FunctionDef) -> Dict[str, Set[int]]:
+def _get_keyword(node: ast.AST) -> str:
     """
-    Return a mapping of Python built-in data types to the line numbers where
-    those types were used, which includes the use of built-in casting functions.
+    Given an AST node, return a string representing the keyword with which it
+    corresponds, or an empty string otherwise.
     """
-    # TODO: use more robust method of ignoring types in test case functions
-    if root.name.startswith("test_"):
-        return {}
+    return _KEYWORDS.get(type(node), "")
 
-    data_types = {}
-    for node in ast.walk(root):
-        if isinstance(node, ast.NameConstant):
-            if node.value is not None:
-                data_types.setdefault("bool", set()).add(node.lineno)
-            else:
-                data_types.setdefault("NoneType", set()).add(node.lineno)
-        elif isinstance(node, ast.Num):
-            type_name = type(node.n).__name__
-            data_types.setdefault(type_name, set()).add(node.lineno)
-        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-            if node.func.id in ("bool", "bytes", "dict", "float", "int",
-                                "list", "set", "str", "tuple"):
-                data_types.setdefault(node.func.id, set()).add(node.lineno)
-        else:
-            type_name = _get_type(node)
-            if type_name:
-                data_types.setdefault(type_name, set()).add(node.lineno)
-    return data_types
+
+def _get_op(node: ast.AST) -> str:
+    """
+    Given an AST node, return a string representing the operator with which it
+    corresponds, or an empty string otherwise.
+    """
+    return _OPERATORS.get(type(node), "")
 
 
 def _get_type(node: ast.AST) -> str:
-    type_map = {"bytes": (ast.Bytes,),
-                 "dict": (ast.Dict, ast.DictComp),
-                 "list": (ast.List, ast.ListComp),
-                  "set": (ast.Set, ast.SetComp),
-                  "str": (ast.Str,),
-                "tuple": (ast.Tuple, ast.GeneratorExp)}
-    for key, cls_list in type_map.items():
-        if isinstance(node, cls_list):
-            return key
-    return ""
+    if isinstance(node, ast.Constant):
+        return _CONSTANT_TYPES.get(type(node.value), "")
+    return _TYPES.get(type(node), "")
+
+
+def _add(features: Features, category: str, feature: str,
+         lineno: int) -> None:
+    features[category].setdefault(feature, set()).add(lineno)
+
+
+def _parse_except(features: Features, node: ast.ExceptHandler,
+                  root: ast.FunctionDef) -> None:
+    allowed = ("AssertionError", "AttributeError", "EOFError", "IndexError",
+               "KeyError", "RuntimeError", "TypeError", "ValueError",
+               "ZeroDivisionError")
+    if node.type is None:
+        _add(features, "exceptions", "BaseException", node.lineno)
+    elif hasattr(node.type, "elts"):
+        for elt in node.type.elts:
+            if elt.id not in allowed:
+                _add(features, "exceptions", elt.id, node.lineno)
+    elif hasattr(node.type, "id") and node.type.id not in allowed:
+        _add(features, "exceptions", node.type.id, node.lineno)
+
+
+def _parse_raise(features: Features, node: ast.Raise,
+                 root: ast.FunctionDef) -> None:
+    if isinstance(node.exc, ast.Call):
+        # TODO: support node.func.attr
+        _add(features, "exceptions", node.exc.func.id + "(...)", node.lineno)
+
+
+def _parse_call(features: Features, node: ast.Call,
+                root: ast.FunctionDef) -> None:
+    if isinstance(node.func, ast.Name):  # built-in functions
+        _add(features, "calls", node.func.id, node.lineno)
+
+    # TODO: detect type of calling object for method calls
+#    elif isinstance(node.func, ast.Attribute):
+#        calling_obj = getattr(node.func.value, "id", "")
+#        if calling_obj != "self":
+#            method_name = calling_obj + "." + node.func.attr
+#            _add(features, "calls", method_name, node.lineno)
+
+
+def _parse_keyword(features: Features, node: ast.AST,
+                   root: ast.FunctionDef) -> None:
+    keyword = _KEYWORDS[type(node)]
+    if keyword != "def" or node.lineno > root.lineno:
+        _add(features, "keywords", keyword, node.lineno)
+
+
+def _parse_ifexp(features: Features, node: ast.IfExp,
+                 root: ast.FunctionDef) -> None:
+    _add(features, "operators", "ifexp", node.lineno)
+
+
+def _parse_subscript(features: Features, node: ast.Subscript,
+                     root: ast.FunctionDef) -> None:
+    if isinstance(node.slice, ast.Index):
+        _add(features, "operators", "index", node.lineno)
+    elif isinstance(node.slice, (ast.Slice, ast.ExtSlice)):
+        _add(features, "operators", "slice", node.lineno)
+
+
+def _parse_compare(features: Features, node: ast.Compare,
+                   root: ast.FunctionDef) -> None:
+    for node_op in node.ops:
+        op = _get_op(node_op)
+        if op:
+            _add(features, "operators", op, node.lineno)
+            if isinstance(node_op, (ast.Not, ast.IsNot, ast.NotIn)):
+                _add(features, "operators", "not", node.lineno)
+
+
+def _parse_op(features: Features, node: ast.AST,
+              root: ast.FunctionDef) -> None:
+    op = _get_op(node.op)
+    if op:
+        _add(features, "operators", op, node.lineno)
+
+
+def _parse_store(features: Features, node: ast.AST,
+                 root: ast.FunctionDef) -> None:
+    _add(features, "operators", "store", node.lineno)
+
+
+def _parse_constant(features: Features, node: ast.Constant,
+                    root: ast.FunctionDef) -> None:
+    type_name = _get_type(node)
+    if type_name:
+        _add(features, "types", type_name, node.lineno)
+
+
+def _parse_cast(features: Features, node: ast.Call,
+                root: ast.FunctionDef) -> None:
+    if isinstance(node.func, ast.Name):
+        if node.func.id in ("bool", "bytes", "dict", "float", "int", "list",
+                            "set", "str", "tuple"):
+            _add(features, "types", node.func.id, node.lineno)
+
+
+def _parse_type(features: Features, node: ast.AST,
+                root: ast.FunctionDef) -> None:
+    _add(features, "types", _TYPES[type(node)], node.lineno)
+
+
+_KEYWORDS: Dict[type, str] = {
+    cls: keyword for keyword, cls_list in {
+          "assert": (ast.Assert,),
+           "break": (ast.Break,),
+           "class": (ast.ClassDef,),
+        "continue": (ast.Continue,),
+             "def": (ast.FunctionDef, ast.AsyncFunctionDef),
+             "del": (ast.Delete,),
+             "for": (ast.For, ast.AsyncFor),
+          "global": (ast.Global,),
+              "if": (ast.If,),
+          "import": (ast.Import, ast.ImportFrom),
+          "lambda": (ast.Lambda,),
+        "nonlocal": (ast.Nonlocal,),
+           "raise": (ast.Raise,),
+          "return": (ast.Return,),
+             "try": (ast.Try,),
+           "while": (ast.While,),
+            "with": (ast.With, ast.AsyncWith),
+           "yield": (ast.Yield, ast.YieldFrom)}.items()
+    for cls in cls_list}
+
+_OPERATORS: Dict[type, str] = {
+    cls: op for op, cls_list in {
+          "+": (ast.UAdd, ast.Add),
+          "-": (ast.USub, ast.Sub),
+          "*": (ast.Mult,),
+         "**": (ast.Pow,),
+          "/": (ast.Div,),
+         "//": (ast.FloorDiv,),
+          "%": (ast.Mod,),
+         "==": (ast.Eq,),
+         "!=": (ast.NotEq,),
+          "<": (ast.Lt,),
+          ">": (ast.Gt,),
+         "<=": (ast.LtE,),
+         ">=": (ast.GtE,),
+        "and": (ast.And,),
+         "or": (ast.Or,),
+         "in": (ast.In, ast.NotIn),
+         "is": (ast.Is, ast.IsNot),
+          "~": (ast.Invert,),
+          "&": (ast.BitAnd,),
+          "|": (ast.BitOr,),
+          "^": (ast.BitXor,),
+         "<<": (ast.LShift,),
+         ">>": (ast.RShift,)}.items()
+    for cls in cls_list}
+
+_TYPES: Dict[type, str] = {
+    cls: type_name for type_name, cls_list in {
+         "dict": (ast.Dict, ast.DictComp),
+         "list": (ast.List, ast.ListComp),
+          "set": (ast.Set, ast.SetComp),
+        "tuple": (ast.Tuple, ast.GeneratorExp)}.items()
+    for cls in cls_list}
+
+_CONSTANT_TYPES: Dict[type, str] = {bool: "bool", type(None): "NoneType",
+                                    int: "int", float: "float",
+                                    complex: "complex", str: "str",
+                                    bytes: "bytes"}
+
+# category -> node type -> handlers
+_HANDLERS: Dict[str, Dict[type, Tuple[Handler, ...]]] = {
+    "calls": {ast.Call: (_parse_call,)},
+    "exceptions": {ast.ExceptHandler: (_parse_except,),
+                   ast.Raise: (_parse_raise,)},
+    "keywords": {cls: (_parse_keyword,) for cls in _KEYWORDS},
+    "operators": {ast.IfExp: (_parse_ifexp,),
+                  ast.Subscript: (_parse_subscript,),
+                  ast.Compare: (_parse_compare,),
+                  ast.UnaryOp: (_parse_op,),
+                  ast.BinOp: (_parse_op,),
+                  ast.BoolOp: (_parse_op,),
+                  ast.AugAssign: (_parse_op,),
+                  ast.Assign: (_parse_store,),
+                  ast.AnnAssign: (_parse_store,)},
+    "types": {ast.Constant: (_parse_constant,), ast.Call: (_parse_cast,),
+              **{cls: (_parse_type,) for cls in _TYPES}}}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_dispatch(categories: Tuple[str, ...]
+) -> Dict[type, Tuple[Handler, ...]]:
+    """Merge the handlers of |categories| into one table keyed by node type."""
+    dispatch = {}
+    for category in categories:
+        for cls, handlers in _HANDLERS[category].items():
+            dispatch[cls] = dispatch.get(cls, ()) + handlers
+    return dispatch
 
 
 #def _is_base_exception(name: str) -> bool:
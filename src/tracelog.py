@@ -0,0 +1,154 @@
+import datetime
+import fcntl
+import json
+import logging
+import logging.handlers
+import os
+from typing import Any, Dict, Iterator
+
+from src import metrics
+from src import utils
+from src.sandbox.ctxman import memory
+
+
+def get_log_path() -> str:
+    return os.path.join(utils.get_root_dirname(), "trace.log")
+
+
+def get_logger(capacity: int = 64, max_bytes: int = 10 * 2**20,
+               backup_count: int = 5) -> logging.Logger:
+    """
+    Return the logger of submission records. Records are buffered in memory
+    and appended to a rotating log file once |capacity| records are buffered,
+    when an error is logged, or on |flush|. The log file may be shared by
+    several processes.
+    """
+    logger = logging.getLogger("casey.trace")
+    if not logger.handlers:
+        path = get_log_path()
+        target = _PrivateFileHandler(path, max_bytes, backup_count)
+        target.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(logging.handlers.MemoryHandler(
+            capacity, flushLevel=logging.ERROR, target=target))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def make_record(course: str, assignment: str, username: str, status: str,
+                is_traced: bool = True, **fields) -> Dict[str, Any]:
+    """
+    Return a record of a submission. If |is_traced|, the record includes the
+    stage durations and details recorded by |metrics| in this process and the
+    peak memory of this process.
+    """
+    record = {"time": datetime.datetime.now().isoformat(timespec="seconds"),
+              "course": course, "assignment": assignment,
+              "username": username, "status": status}
+    if is_traced:
+        durations = metrics.get_durations()
+        record["total"] = round(durations.get("total", 0.0), 6)
+        record["stages"] = {stage: round(seconds, 6)
+                            for stage, seconds in durations.items()}
+        record["peak_memory_kb"] = memory.get_max_rss()
+        record.update(metrics.get_fields())
+    record.update(fields)
+    return record
+
+
+def write(record: Dict[str, Any]) -> None:
+    level = logging.ERROR if record["status"] == "error" else logging.INFO
+    get_logger().log(level, json.dumps(record, sort_keys=True))
+
+
+def flush() -> None:
+    for handler in get_logger().handlers:
+        handler.flush()
+
+
+def read_records() -> Iterator[Dict[str, Any]]:
+    """Yield every record in the log and its backups, oldest first."""
+    path = get_log_path()
+    paths = [path]
+    while os.path.exists(f"{path}.{len(paths)}"):
+        paths.append(f"{path}.{len(paths)}")
+    for path in reversed(paths):
+        if os.path.exists(path):
+            with open(path, "r") as fp:
+                for line in fp:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        pass
+
+
+class _PrivateFileHandler(logging.handlers.WatchedFileHandler):
+    """
+    File handler that keeps the log readable only by its owner and that
+    several processes (the server's workers and the zygote) may share. Each
+    record is appended, and the log rotated once it reaches |max_bytes|,
+    while holding an exclusive lock on <log>.lock, and a process reopens the
+    log whenever another process has rotated it.
+    """
+
+    def __init__(self, filename: str, max_bytes: int,
+                 backup_count: int) -> None:
+        super().__init__(filename, delay=True)
+        self.max_bytes: int = max_bytes
+        self.backup_count: int = backup_count
+        self._lock_fd: int = -1
+        self._pid: int = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            fd = self._get_lock_fd()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError:
+            self.handleError(record)
+            return
+        try:
+            if self._should_rotate():
+                self._rotate()
+            super().emit(record)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _open(self):
+        stream = super()._open()
+        os.chmod(self.baseFilename, 0o600)
+        stat = os.fstat(stream.fileno())
+        self.dev, self.ino = stat.st_dev, stat.st_ino
+        return stream
+
+    def _get_lock_fd(self) -> int:
+        """
+        Return the lock file of the current process, which must not share the
+        lock of the process it was forked from.
+        """
+        if self._pid != os.getpid():
+            if self._lock_fd >= 0 and self._pid:
+                os.close(self._lock_fd)
+            self._pid = os.getpid()
+            self._lock_fd = os.open(self.baseFilename + ".lock",
+                                    os.O_WRONLY | os.O_CREAT, 0o600)
+        return self._lock_fd
+
+    def _should_rotate(self) -> bool:
+        try:
+            return (self.max_bytes > 0
+                    and os.path.getsize(self.baseFilename) >= self.max_bytes)
+        except OSError:
+            return False
+
+    def _rotate(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.baseFilename}.{i}"):
+                os.replace(f"{self.baseFilename}.{i}",
+                           f"{self.baseFilename}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.baseFilename, f"{self.baseFilename}.1")
+        else:
+            os.remove(self.baseFilename)
@@ -2,7 +2,7 @@ import configparser
 import os
 import pwd
 import re
-from typing import List
+from typing import List, Sequence
 
 
 def secure_filename(filename: str) -> str:
@@ -34,6 +34,10 @@ def get_temp_dirname(course: str, assignment: str, username: str) -> str:
     return os.path.join(get_submit_dirname(course, assignment, username), "tmp")
 
 
+def get_cache_dirname(course: str, assignment: str) -> str:
+    return os.path.join(get_root_dirname(), ".cache", course, assignment)
+
+
 def get_top_dirname() -> str:
     pattern = re.compile(os.path.join(os.environ["HOME"], r".*?" + os.sep))
     return re.search(pattern, os.sep + __file__).group()
@@ -47,6 +51,21 @@ def get_cases_path(course: str, assignment: str) -> str:
     return os.path.join(get_assignment_dirname(course, assignment), "cases.py")
 
 
+def get_cfg_path(course: str, assignment: str, filename: str) -> str:
+    """
+    Return the path of the assignment's tool config (e.g. pylint.cfg), or
+    that of the course or of all courses if the assignment has none.
+    """
+    parent = get_top_dirname()
+    paths = [os.path.join(parent, "cases", course, assignment, filename),
+             os.path.join(parent, "cases", course, filename),
+             os.path.join(parent, "cases", filename)]
+    for path in paths:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError
+
+
 def get_filenames(course: str, assignment: str) -> List[str]:
     cfg_name = "rules.cfg"
     path = os.path.join(get_assignment_dirname(course, assignment), cfg_name)
@@ -68,3 +87,12 @@ def colorize(chars: str, color: str = "reset", bold: bool = False) -> str:
     if bold:
         chars = "\033[1m" + chars + "\033[0m"
     return chars
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of values, or 0.0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
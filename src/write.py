@@ -4,19 +4,30 @@ import os
 import shutil
 from typing import Dict, Optional, Tuple
 
+from src import gradebook
+
 
 class Writer:
 
-    def __init__(self, files: Dict[str, str]) -> None:
+    def __init__(self, files: Dict[str, str],
+                 book: Optional[gradebook.Gradebook] = None) -> None:
         self.scores_filename = "scores.json"
         self.dirname = os.path.dirname(tuple(files)[0])
+        self.scores: Optional[Dict[str, float]] = None
+        self.gradebook = book or gradebook.Gradebook()
         self._write_files(files)
 
     def load_scores(self) -> Optional[Dict[str, float]]:
+        scores = self.gradebook.load(*self._get_key())
+        if scores is not None:
+            return scores
         path = os.path.join(os.path.dirname(self.dirname), self.scores_filename)
         if os.path.exists(path):
             with open(path, "r") as fp:
-                return json.load(fp)
+                scores = json.load(fp)
+            # index the scores recorded before the gradebook existed
+            self.gradebook.update(*self._get_key(), scores)
+            return scores
 
     def write_scores(self, scores: Dict[str, float],
                      result: Tuple[str, float]) -> bool:
@@ -25,6 +36,7 @@ class Writer:
             Writer._remove(path)
         scores = {name: score for (name, _), score in scores.items()}
         scores.update({result[0]: result[1]})
+        self.scores = scores
         if os.path.exists(os.path.dirname(path)):
             with open(path, "w") as fp:
                 json.dump(scores, fp, indent=2)
@@ -48,11 +60,21 @@ class Writer:
                 except IsADirectoryError:
                     pass
         uncopied = filecmp.dircmp(self.dirname, parent, ignore=ignore).left_only
+        if self.scores is not None:
+            self.gradebook.update(*self._get_key(), self.scores)
         if not uncopied:
             Writer._remove(self.dirname)
             return True
         return False
 
+    def _get_key(self) -> Tuple[str, str, str]:
+        """Return the course, assignment, and username of the submission."""
+        submit_dirname = os.path.dirname(self.dirname)
+        assignment_dirname = os.path.dirname(submit_dirname)
+        return (os.path.basename(os.path.dirname(assignment_dirname)),
+                os.path.basename(assignment_dirname),
+                os.path.basename(submit_dirname))
+
     def _write_files(self, files: Dict[str, str]) -> bool:
         exists = []
         os.makedirs(self.dirname, mode=0o700, exist_ok=True)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import admin
+from src import error
+
+
+def _raise_runtime_error(*args, **kwargs):
+    raise error.CaseyRuntimeError("cases failed")
+
+
+def _fail_alice(course, assignment, username, files, **kwargs):
+    if username == "alice":
+        raise error.CaseyRuntimeError("cases failed")
+    return "Submission Status | SUCCESS |\n"
+
+
+class TestRegrade(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for username in ("alice", "bob"):
+            dirname = os.path.join(tempdir.name, "101", "pset1", username)
+            os.makedirs(dirname)
+            with open(os.path.join(dirname, "pset1.py"), "w") as fp:
+                fp.write("x = 1\n")
+        self.root = tempdir.name
+
+    @mock.patch("src.casey.run", _raise_runtime_error)
+    def test_casey_error(self):
+        admin._init_regrade("101", "pset1", 5)
+        self.assertEqual(admin._regrade_user("alice"),
+                         ("alice", "error (CaseyRuntimeError('cases failed'))",
+                          False))
+
+    def test_no_files(self):
+        admin._init_regrade("101", "pset1", 5)
+        os.makedirs(os.path.join(self.root, "101", "pset1", "carol"))
+        self.assertEqual(admin._regrade_user("carol"), ("carol", "no files", True))
+
+    @mock.patch("src.casey.run", return_value="")
+    def test_no_output(self, _):
+        admin._init_regrade("101", "pset1", 5)
+        self.assertEqual(admin._regrade_user("alice"),
+                         ("alice", "no output", False))
+
+    @mock.patch("src.casey.run", _raise_runtime_error)
+    def test_pool_completes(self):
+        with mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+            admin.regrade("101", "pset1", 2, 5)
+        with open(self._get_progress_path(), "r") as fp:
+            self.assertEqual(fp.read(), "")
+
+    @mock.patch("src.casey.run", _fail_alice)
+    def test_failed_users_retried(self):
+        with mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+            admin.regrade("101", "pset1", 2, 5)
+        with open(self._get_progress_path(), "r") as fp:
+            self.assertEqual(fp.read(), "bob\n")
+        with mock.patch("src.casey.run", return_value="Submission Status\n"), \
+             mock.patch("sys.stderr"), mock.patch("sys.stdout"):
+            admin.regrade("101", "pset1", 2, 5)
+        self.assertFalse(os.path.exists(self._get_progress_path()))
+
+    def _get_progress_path(self):
+        return os.path.join(self.root, ".cache", "101", "pset1",
+                            "regrade.txt")
+
+if __name__ == "__main__":
+    unittest.main()
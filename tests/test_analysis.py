@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.static import analysis
+
+
+class TestCheckCached(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dirname = tempdir.name
+        self.cfg_path = self._write("pylint.cfg", "[MASTER]\n")
+        self.paths = (self._write("a.py", "x = 1\n"),
+                      self._write("b.py", "y = 1\n"))
+        self.checked = []
+
+    def _write(self, filename, text):
+        path = os.path.join(self.dirname, filename)
+        with open(path, "w") as fp:
+            fp.write(text)
+        return path
+
+    def _check(self, paths):
+        self.checked.append(tuple(os.path.basename(path) for path in paths))
+        return {os.path.basename(path): [os.path.basename(path)]
+                for path in paths}
+
+    def _run(self, is_cross_file):
+        return analysis._check_cached("101", "pset1", self.paths,
+                                      self.cfg_path, "tool", self._check,
+                                      is_cross_file)
+
+    def test_cached(self):
+        self.assertEqual(self._run(False), ["a.py", "b.py"])
+        self.assertEqual(self._run(False), ["a.py", "b.py"])
+        self.assertEqual(self.checked, [("a.py", "b.py")])
+
+    def test_stale_file_checks_all(self):
+        self._run(False)
+        self._write("b.py", "y = 2\n")
+        self.assertEqual(self._run(False), ["a.py", "b.py"])
+        self.assertEqual(self.checked, [("a.py", "b.py")] * 2)
+
+    def test_cross_file_keys(self):
+        self._run(True)
+        self._write("b.py", "y = 2\n")
+        self._run(True)
+        # the files of the first run are still cached
+        self._write("b.py", "y = 1\n")
+        self._run(True)
+        self._write("a.py", "x = 2\n")
+        self._write("b.py", "y = 2\n")
+        self._run(True)
+        self.assertEqual(len(self.checked), 3)
+
+
+class TestClaimMypyCache(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cfg_path = os.path.join(tempdir.name, "mypy.cfg")
+        with open(self.cfg_path, "w") as fp:
+            fp.write("[mypy]\n")
+
+    def _claim(self):
+        return analysis._claim_mypy_cache("101", "pset1", self.cfg_path)
+
+    def test_concurrent_claims(self):
+        with self._claim() as first:
+            with self._claim() as second:
+                self.assertNotEqual(first, second)
+        with self._claim() as again:
+            self.assertEqual(again, first)
+
+    def test_claim_from_other_process(self):
+        reader, writer = os.pipe()
+        with self._claim() as first:
+            pid = os.fork()
+            if not pid:
+                try:
+                    with self._claim() as other:
+                        os.write(writer, other.encode())
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+        os.close(writer)
+        other = os.read(reader, 4096).decode()
+        os.close(reader)
+        self.assertNotEqual(other, first)
+
+
+if __name__ == "__main__":
+    unittest.main()
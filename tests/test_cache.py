@@ -0,0 +1,118 @@
+import configparser
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src import cache
+from src import casey
+from src.grade import grade
+
+
+class TestMakeKey(unittest.TestCase):
+
+    def test_equal_values(self):
+        self.assertEqual(cache.make_key({"a": 1, "b": [2]}, "x"),
+                         cache.make_key({"b": [2], "a": 1}, "x"))
+
+    def test_different_values(self):
+        self.assertNotEqual(cache.make_key("pset1.py", "x = 1\n"),
+                            cache.make_key("pset1.py", "x = 2\n"))
+        self.assertNotEqual(cache.make_key(1, "x"), cache.make_key("1", "x"))
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.dirname = tempdir.name
+
+    def test_put_fails(self):
+        path = os.path.join(self.dirname, "file")
+        open(path, "w").close()
+        entries = cache.DiskCache(os.path.join(path, "cache"))
+        entries.put("key", "value")
+        self.assertIsNone(entries.get("key"))
+
+    def test_evict_vanished(self):
+        entries = cache.DiskCache(self.dirname, max_entries=1)
+        entries.put("a", "a")
+        getmtime = os.path.getmtime
+
+        def evicted(path):
+            if path.endswith("a.json"):
+                raise FileNotFoundError(path)
+            return getmtime(path)
+
+        with mock.patch("os.path.getmtime", evicted):
+            entries.put("b", "b")
+        self.assertEqual(entries.get("b"), "b")
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = configparser.ConfigParser()
+        self.config.read_dict({"calls": {"print": ""}})
+
+    def _create(self, versions=(1,)):
+        return cache.ResultCache("101", "pset1", self.config, versions)
+
+    def test_get_put(self):
+        results = self._create()
+        self.assertIsNone(results.get("key"))
+        results.put("key", {"scores": [["a", 1.0, 0.5]]})
+        self.assertEqual(self._create().get("key"),
+                         {"scores": [["a", 1.0, 0.5]]})
+
+    def test_versions_invalidate(self):
+        self._create((1, "pylint 2.5.0")).put("key", "graded")
+        results = self._create((1, "pylint 2.6.0"))
+        self.assertIsNone(results.get("key"))
+        self.assertIsNone(self._create((1, "pylint 2.5.0")).get("key"))
+
+    def test_config_invalidates(self):
+        self._create().put("key", "graded")
+        self.config.read_dict({"calls": {"input": ""}})
+        self.assertIsNone(self._create().get("key"))
+
+    def test_evict(self):
+        results = cache.ResultCache("101", "pset1", self.config,
+                                    max_entries=2)
+        for key in ("a", "b", "c"):
+            results.put(key, key)
+        found = [key for key in ("a", "b", "c") if results.get(key)]
+        self.assertEqual(len(found), 2)
+        self.assertIn("c", found)
+
+
+class TestIsCacheable(unittest.TestCase):
+
+    def _graded(self, errors):
+        return {"scores": [], "result": [], "errors": errors}
+
+    def test_deterministic(self):
+        self.assertTrue(casey._is_cacheable(self._graded("")))
+        self.assertTrue(casey._is_cacheable(self._graded(
+            "ERROR: pset1.problem_1\n[EXPECT] ...\nZeroDivisionError")))
+
+    def test_server_dependent(self):
+        for errors in ("src.error.CaseyTimeoutError: Process exceeded 1 "
+                       "second(s)",
+                       "src.error.CaseyRuntimeError: Traceback ...",
+                       "MemoryError: Process exceeded 512 MB",
+                       grade.NOT_READY,
+                       grade.TERMINATED):
+            with self.subTest(errors=errors):
+                self.assertFalse(casey._is_cacheable(self._graded(errors)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src import error
+from src.grade import case
+from src.grade import grade
+from src.sandbox import safedef
+from src.sandbox import sandbox
+
+
+def double(x: int) -> int:
+    return 2 * x
+
+
+def crash(x: int) -> int:
+    os._exit(1)
+
+
+def hang(x: int) -> int:
+    # block the timers' signals, like code stuck in a C extension
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM, signal.SIGPROF,
+                                              signal.SIGVTALRM})
+    time.sleep(60)
+    return 2 * x
+
+
+class FakePackage(object):
+    """The parts of a SafePackage used to run cases."""
+
+    def __init__(self, dirname: str) -> None:
+        self.sandbox = sandbox.Sandbox(("print",), (), dirname, False)
+        self.errors = error.ErrorFormatter({})
+        self.safemods = []
+
+
+class TestIterCases(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.dirname = tempdir.name
+        patcher = mock.patch.object(grade, "MIN_CHUNK", 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _groups(self, pkg, function=double):
+        safefun = safedef.SafeFunction(function, pkg.sandbox)
+        # every fifth case of a group fails
+        return {(name, weight): [case.Case(safefun, (i,),
+                                           2 * i + (i % 5 == 0))
+                                 for i in range(n_cases)]
+                for name, weight, n_cases in (("g1", 1.0, 18),
+                                              ("g2", 2.0, 0),
+                                              ("g3", 0.5, 9))}
+
+    def _run(self, workers, function=double, group_time=0):
+        pkg = FakePackage(self.dirname)
+        scores = list(grade.iter_cases(pkg, self._groups(pkg, function),
+                                       workers=workers, group_time=group_time))
+        return scores, pkg.errors.format_all()
+
+    def test_sequential(self):
+        scores, errors = self._run(1)
+        self.assertEqual(scores, [(("g1", 1.0), 14 / 18), (("g2", 2.0), 0),
+                                  (("g3", 0.5), 7 / 9)])
+        self.assertIn(grade.NOT_READY, errors)
+        self.assertEqual(errors.count("[EXPECT]"), 6)
+
+    def test_forked_matches_sequential(self):
+        expected = self._run(1)
+        for workers in (2, 3, 8):
+            with self.subTest(workers=workers):
+                self.assertEqual(self._run(workers), expected)
+
+    def test_killed_chunk(self):
+        scores, errors = self._run(3, function=crash)
+        self.assertEqual([score for _, score in scores], [0, 0, 0])
+        self.assertIn(grade.TERMINATED, errors)
+
+    def test_stuck_chunk(self):
+        started = time.monotonic()
+        scores, errors = self._run(2, function=hang, group_time=1)
+        self.assertLess(time.monotonic() - started, 15)
+        self.assertEqual([score for _, score in scores], [0, 0, 0])
+        self.assertIn(grade.TERMINATED, errors)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src import gradebook
+from src import write
+
+
+class TestGradebook(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dirname = tempdir.name
+        self.book = gradebook.Gradebook()
+
+    def _write_scores(self, assignment, username, scores):
+        dirname = os.path.join(self.dirname, "101", assignment, username)
+        os.makedirs(dirname)
+        with open(os.path.join(dirname, "scores.json"), "w") as fp:
+            json.dump(scores, fp)
+
+    def test_indexed(self):
+        self.book.update("101", "pset1", "ann", {"[TOTAL]": 0.5})
+        self.assertEqual(self.book.get_totals("101", "ann"), {"pset1": 0.5})
+        self.assertEqual(self.book.get_totals("101", "bob"), {})
+
+    def test_unindexed_scores(self):
+        self._write_scores("pset1", "ann", {"[TOTAL]": 0.25})
+        self._write_scores("pset2", "ann", {"[TOTAL]": 0.75})
+        self.assertEqual(self.book.get_totals("101", "ann"), {})
+        path = os.path.join(self.dirname, "101", "pset2", "ann", "new",
+                            "pset1.py")
+        writer = write.Writer({path: "x = 1\n"}, self.book)
+        self.assertEqual(writer.load_scores(), {"[TOTAL]": 0.75})
+        self.assertEqual(self.book.get_totals("101", "ann"), {"pset2": 0.75})
+
+    def test_rebuild(self):
+        self.book.update("101", "pset1", "ann", {"[TOTAL]": 0.5})
+        self._write_scores("pset2", "ann", {"[TOTAL]": 0.75})
+        self._write_scores("pset2", "bob", {"[TOTAL]": 1.0})
+        self.assertEqual(self.book.rebuild("101"), 2)
+        self.assertEqual(self.book.get_totals("101", "ann"),
+                         {"pset1": 0.5, "pset2": 0.75})
+        self.assertEqual(self.book.get_totals("101", "bob"), {"pset2": 1.0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.serve import jobs
+
+
+class TestFailOrphans(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, job_id, status, **extra):
+        jobs.write_status("101", "pset1", "ann", job_id, status, **extra)
+
+    def _read(self, job_id):
+        return jobs.read_status("101", "pset1", "ann", job_id)["status"]
+
+    def test_orphans(self):
+        pid = os.fork()
+        if not pid:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self._write("a" * 32, "queued")
+        self._write("b" * 32, "running", pid=pid)
+        self._write("c" * 32, "running", pid=os.getpid())
+        self._write("d" * 32, "done", output="output")
+        self.assertEqual(jobs.fail_orphans(), 2)
+        self.assertEqual([self._read(c * 32) for c in "abcd"],
+                         ["error", "error", "running", "done"])
+        self.assertEqual(jobs.fail_orphans(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
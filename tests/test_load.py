@@ -0,0 +1,37 @@
+import unittest
+
+from bench import load
+
+
+class TestBuildSubmissions(unittest.TestCase):
+
+    def test_unique_sources(self):
+        submissions = load.build_submissions("101", "pset1", 6, 2,
+                                             {"pass": 1.0})
+        sources = {files["pset1.py"] for _, _, files in submissions}
+        self.assertEqual(len(sources), 6)
+        self.assertEqual({username for username, _, _ in submissions},
+                         {"load0000", "load0001"})
+
+    def test_cached(self):
+        submissions = load.build_submissions("101", "pset1", 3, 3,
+                                             {"pass": 1.0}, is_cached=True)
+        self.assertEqual(len({files["pset1.py"]
+                              for _, _, files in submissions}), 1)
+
+
+class TestClassify(unittest.TestCase):
+
+    def test_outcomes(self):
+        self.assertEqual(load._classify("   [TOTAL] | 100%\n"), "graded")
+        self.assertEqual(load._classify("Submission Closed: 101 pset1\n"),
+                         "closed")
+        for text in ("Invalid course number or assignment name\n",
+                     "Test cases not yet ready, try again later\n",
+                     "Casey encountered an unexpected error.\n"):
+            with self.subTest(text=text):
+                self.assertEqual(load._classify(text), "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
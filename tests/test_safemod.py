@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from src import error
+from src.sandbox import safemod
+from src.sandbox import sandbox
+
+
+class TestInstall(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.dirname = tempdir.name
+        self.sb = sandbox.Sandbox(("print",), (), self.dirname, False)
+        self.addCleanup(safemod.install, [])
+
+    def _load(self, files):
+        safemods = [safemod.SafeModule(os.path.join(self.dirname, name),
+                                       source)
+                    for name, source in files.items()]
+        safemod.install(safemods)
+        errors = error.ErrorFormatter(
+            {sm.path: sm.source for sm in safemods})
+        loaded = [sm.load(errors, self.sb) for sm in safemods]
+        return safemods, loaded, errors
+
+    def test_sibling_import(self):
+        safemods, loaded, _ = self._load({
+            "helper_mod.py": "VALUE = 1\n",
+            "main_mod.py": "import helper_mod\nVALUE = helper_mod.VALUE\n"})
+        self.assertEqual(loaded, [True, True])
+        self.assertEqual(safemods[1].module.VALUE, 1)
+
+    def test_previous_submission_removed(self):
+        self._load({"helper_mod.py": "VALUE = 1\n",
+                    "main_mod.py": "import helper_mod\n"})
+        self.assertIn("helper_mod", sys.modules)
+        safemods, _, _ = self._load({"main_mod.py": "import helper_mod\n"})
+        self.assertIsNone(safemods[0].module)
+        self.assertNotIn("helper_mod", sys.modules)
+
+    def test_replaced_sibling(self):
+        self._load({"helper_mod.py": "VALUE = 1\n",
+                    "main_mod.py": "import helper_mod\n"})
+        safemods, _, _ = self._load({
+            "helper_mod.py": "VALUE = 2\n",
+            "main_mod.py": "import helper_mod\nVALUE = helper_mod.VALUE\n"})
+        self.assertEqual(safemods[1].module.VALUE, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
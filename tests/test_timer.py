@@ -0,0 +1,95 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src import error
+from src.sandbox import safedef
+from src.sandbox import safemod
+from src.sandbox import sandbox
+
+
+def _nap(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def _spin() -> None:
+    while True:
+        pass
+
+
+class TestDeadlines(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.dirname = tempdir.name
+        self.sb = sandbox.Sandbox(("print",), (), self.dirname, False,
+                                  wall_limit=1)
+        self.nap = safedef.SafeFunction(_nap, self.sb, use_disable=False)
+
+    def assertTimedOut(self, result, message):
+        self.assertIs(result.exc_info[0], error.CaseyTimeoutError)
+        self.assertTrue(str(result.exc_info[1]).startswith(message))
+
+    def test_case_wall_limit(self):
+        started = time.monotonic()
+        result = self.nap.capture(5, _timeout=1)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTimedOut(result, "Process exceeded 1 second(s) of "
+                                    "wall-clock time")
+        self.assertEqual(self.nap.capture(0.01, _timeout=1).retval, 0.01)
+
+    def test_cpu_limit(self):
+        self.sb.get_ctxman("Timer").wall_seconds = 3
+        spin = safedef.SafeFunction(_spin, self.sb, use_disable=False)
+        result = spin.capture(_timeout=1)
+        self.assertTimedOut(result, "Process exceeded 1 second(s)")
+        self.assertNotIn("wall-clock", str(result.exc_info[1]))
+
+    def test_group_deadline(self):
+        self.sb.get_ctxman("Timer").wall_seconds = 0
+        self.sb.set_deadline("Group", 1)
+        with self.sb.session():
+            results = [self.nap.capture(0.6, _timeout=1) for _ in range(3)]
+            results.append(self.nap.capture(0, _timeout=1))
+        self.assertEqual(results[0].retval, 0.6)
+        for result in results[1:3]:
+            self.assertTimedOut(result, "Group exceeded 1 second(s)")
+        # cases that do not wait still run once the deadline has passed
+        self.assertEqual(results[3].retval, 0)
+
+    def test_removed_deadline(self):
+        self.sb.get_ctxman("Timer").wall_seconds = 0
+        self.sb.set_deadline("Group", 1)
+        self.sb.set_deadline("Group", 0)
+        self.assertEqual(self.nap.capture(1.2, _timeout=1).retval, 1.2)
+
+    def test_submission_deadline_on_import(self):
+        for source in ("import time\ntime.sleep(30)\n", "while True:\n"
+                                                         "    pass\n"):
+            with self.subTest(source=source):
+                sm = safemod.SafeModule(os.path.join(self.dirname, "mod.py"),
+                                        source)
+                safemod.install([sm])
+                errors = error.ErrorFormatter({sm.path: source})
+                self.sb.set_deadline("Submission", 1)
+                started = time.monotonic()
+                self.assertFalse(sm.load(errors, self.sb))
+                self.assertLess(time.monotonic() - started, 2)
+                self.assertIn("Submission exceeded 1 second(s)",
+                              errors.format_all())
+
+    def test_outer_timer_resumes(self):
+        self.sb.set_deadline("Submission", 1)
+        started = time.monotonic()
+        with self.assertRaises(error.CaseyTimeoutError):
+            with self.sb.get_timer():
+                self.assertEqual(self.nap(0.01), 0.01)
+                time.sleep(5)
+        self.assertLess(time.monotonic() - started, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
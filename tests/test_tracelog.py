@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from src import tracelog
+
+
+class TestPrivateFileHandler(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.path = os.path.join(tempdir.name, "trace.log")
+
+    def _read(self):
+        lines = []
+        for i in range(10, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                with open(f"{self.path}.{i}", "r") as fp:
+                    lines.extend(fp)
+        with open(self.path, "r") as fp:
+            lines.extend(fp)
+        return [json.loads(line) for line in lines]
+
+    def _write(self, writer, count, backup_count=10):
+        handler = tracelog._PrivateFileHandler(self.path, 4096,
+                                               backup_count)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        for i in range(count):
+            handler.handle(logging.makeLogRecord(
+                {"msg": json.dumps({"writer": writer, "i": i,
+                                    "padding": "x" * 100})}))
+        handler.close()
+
+    def test_processes_share_log(self):
+        pids = []
+        for writer in range(4):
+            pid = os.fork()
+            if not pid:
+                try:
+                    self._write(writer, 50)
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+        records = self._read()
+        self.assertEqual(len(records), 200)
+        for writer in range(4):
+            self.assertEqual([record["i"] for record in records
+                              if record["writer"] == writer], list(range(50)))
+        self.assertLessEqual(os.path.getsize(f"{self.path}.1"), 4096 + 256)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_rotation_keeps_backups(self):
+        self._write(0, 200, backup_count=3)
+        self.assertTrue(os.path.exists(f"{self.path}.3"))
+        self.assertFalse(os.path.exists(f"{self.path}.4"))
+        records = self._read()
+        self.assertLess(len(records), 200)
+        self.assertEqual(records[-1]["i"], 199)
+        self.assertEqual([record["i"] for record in records],
+                         list(range(records[0]["i"], 200)))
+
+
+if __name__ == "__main__":
+    unittest.main()
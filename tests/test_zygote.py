@@ -0,0 +1,55 @@
+import os
+import signal
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.serve import zygote
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        patcher = mock.patch("src.utils.get_root_dirname",
+                             return_value=tempdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.supervisor = zygote.Supervisor(
+            os.path.join(tempdir.name, "casey.sock"), 2)
+        self.supervisor.start()
+        self.addCleanup(self._kill)
+
+    def _kill(self):
+        try:
+            os.kill(self.supervisor.pid, signal.SIGKILL)
+            os.waitpid(self.supervisor.pid, 0)
+        except (ChildProcessError, ProcessLookupError):
+            pass
+
+    def test_idle_connection(self):
+        idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(idle.close)
+        idle.connect(self.supervisor.address)
+        started = time.monotonic()
+        stats = self.supervisor.stats()
+        self.assertEqual(stats["capacity"], 2)
+        self.assertEqual(stats["active"], 0)
+        # the zygote preloads the linters before serving the first request
+        self.assertLess(time.monotonic() - started, 60)
+        started = time.monotonic()
+        self.supervisor.stats()
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_restart(self):
+        pid = self.supervisor.pid
+        self._kill()
+        self.assertEqual(self.supervisor.stats()["active"], 0)
+        self.assertNotEqual(self.supervisor.pid, pid)
+
+
+if __name__ == "__main__":
+    unittest.main()